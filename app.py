@@ -18,32 +18,66 @@ along with this program. If not, see <https://www.gnu.org/licenses/>.
 """
 
 from flask import Flask, render_template_string, request, jsonify, send_file
+from werkzeug.utils import safe_join
 from plexapi.server import PlexServer
+from plexapi.library import Library
+from plexapi import utils as plex_utils
+from plexapi.exceptions import NotFound, Unauthorized
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import requests
+import base64
+import bisect
+import contextvars
 import csv
+import gzip
+import hashlib
+import heapq
+import importlib.util
 import json
 import os
-from datetime import datetime, timedelta
+import pickle
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from array import array
+from concurrent.futures import ThreadPoolExecutor, CancelledError, as_completed
+from collections import Counter, OrderedDict, defaultdict, deque, namedtuple
+from contextlib import contextmanager, nullcontext
+from operator import itemgetter
+from datetime import datetime, timedelta, timezone
+from urllib.parse import urlsplit
+
+try:
+    import numpy as np
+except ImportError:  # space analytics fall back to plain Python loops
+    np = None
 
 app = Flask(__name__)
 
 CONFIG_FILE = '/config/config.json'
+HISTORY_DB_FILE = '/config/history.db'
+SNAPSHOT_DB_FILE = '/config/snapshots.db'
 REPORTS_DIR = '/reports'
 
 # Get Plex connection info from environment variables
 PLEX_URL = os.environ.get('PLEX_URL', '')
 PLEX_TOKEN = os.environ.get('PLEX_TOKEN', '')
 
-# Global progress tracking
-progress_data = {
-    'current': 0,
-    'total': 0,
-    'current_library': '',
-    'libraries_order': [],
-    'current_item': 0,
-    'total_items': 0
-}
+# Report jobs - how many may run at once, and how many finished jobs to remember
+MAX_CONCURRENT_JOBS = int(os.environ.get('MAX_CONCURRENT_JOBS', '1'))
+JOB_RETENTION = 50
+# Libraries generated at the same time within one job
+PARALLEL_LIBRARIES = int(os.environ.get('PARALLEL_LIBRARIES', '1'))
+# Generated reports kept in memory for /api/reports queries
+REPORT_STORE_LIMIT = int(os.environ.get('REPORT_STORE_LIMIT', '20'))
+# Seconds the library list (sections and item counts) is cached for
+LIBRARY_CACHE_TTL = int(os.environ.get('LIBRARY_CACHE_TTL', '300'))
 
-HTML_TEMPLATE = """<!DOCTYPE html><html lang="en"><head><meta charset="UTF-8"><meta name="viewport" content="width=device-width, initial-scale=1.0"><title>Plex Unwatched Reporter</title><style>@import url('https://fonts.googleapis.com/css2?family=Share+Tech+Mono&display=swap');*{margin:0;padding:0;box-sizing:border-box}body{font-family:'Share Tech Mono','Courier New',monospace;background:#000;color:#ffb000;padding:2rem;min-height:100vh;position:relative;overflow-x:hidden;background-image:linear-gradient(rgba(255,176,0,0.03) 1px,transparent 1px),linear-gradient(90deg,rgba(255,176,0,0.03) 1px,transparent 1px);background-size:50px 50px}body::before{content:"";position:fixed;top:0;left:0;width:100%;height:100%;background:repeating-linear-gradient(0deg,rgba(0,0,0,0.15),rgba(0,0,0,0.15) 1px,transparent 1px,transparent 2px);pointer-events:none;z-index:1000}body::after{content:"";position:fixed;top:0;left:0;width:100%;height:100%;background:radial-gradient(ellipse at center,rgba(255,176,0,0.1) 0%,transparent 70%);pointer-events:none;z-index:999}.container{max-width:1200px;margin:0 auto;position:relative;z-index:1}.header{margin-bottom:2rem;text-align:center;border:2px solid #ffb000;padding:1.5rem;background:rgba(255,176,0,0.05);box-shadow:0 0 20px rgba(255,176,0,0.3),inset 0 0 20px rgba(255,176,0,0.1);position:relative}.header::before{content:"▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲";position:absolute;top:-12px;left:50%;transform:translateX(-50%);background:#000;padding:0 10px;font-size:0.5rem;letter-spacing:2px}.header h1{font-size:2.5rem;margin-bottom:0.5rem;text-shadow:0 0 10px rgba(255,176,0,0.8),0 0 20px rgba(255,176,0,0.6),0 0 30px rgba(255,176,0,0.4);letter-spacing:3px;animation:flicker 3s infinite alternate}@keyframes flicker{0%,100%{opacity:1}41.99%{opacity:1}42%{opacity:0.8}43%{opacity:1}45.99%{opacity:1}46%{opacity:0.85}46.5%{opacity:1}}.header p{color:#cc8800;text-transform:uppercase;letter-spacing:2px;font-size:0.9rem}.card{background:rgba(0,0,0,0.8);border:2px solid #ffb000;padding:1.5rem;margin-bottom:1.5rem;box-shadow:0 0 20px rgba(255,176,0,0.3),inset 0 0 40px rgba(255,176,0,0.05);position:relative}.card::before{content:"";position:absolute;top:0;left:0;right:0;height:1px;background:linear-gradient(90deg,transparent,#ffb000,transparent);opacity:0.5}.card h2{font-size:1.5rem;margin-bottom:1rem;text-transform:uppercase;letter-spacing:3px;text-shadow:0 0 10px rgba(255,176,0,0.8);border-bottom:1px solid #ffb000;padding-bottom:0.5rem}.info-box{background:rgba(255,176,0,0.05);border-left:3px solid #ffb000;padding:0.75rem 1rem;margin-bottom:1.5rem;font-size:0.875rem;letter-spacing:1px;line-height:1.6}.form-group{margin-bottom:1rem}label{display:block;font-size:0.875rem;font-weight:500;margin-bottom:0.5rem;text-transform:uppercase;letter-spacing:1px;color:#ffb000}input[type="text"],input[type="number"]{width:100%;background:#000;border:2px solid #ffb000;color:#ffb000;padding:0.75rem 1rem;font-size:1rem;font-family:'Share Tech Mono',monospace;box-shadow:inset 0 0 10px rgba(255,176,0,0.2)}input[type="text"]:focus,input[type="number"]:focus{outline:none;box-shadow:inset 0 0 10px rgba(255,176,0,0.3),0 0 15px rgba(255,176,0,0.5);animation:pulse 1.5s infinite}@keyframes pulse{0%,100%{border-color:#ffb000}50%{border-color:#ffcc44}}.button-group{display:flex;gap:0.75rem;flex-wrap:wrap}button{padding:0.75rem 1.5rem;border:2px solid #ffb000;font-weight:500;cursor:pointer;font-size:1rem;font-family:'Share Tech Mono',monospace;transition:all 0.2s;display:flex;align-items:center;gap:0.5rem;text-transform:uppercase;letter-spacing:2px;position:relative;overflow:hidden}button::before{content:"";position:absolute;top:50%;left:50%;width:0;height:0;border-radius:50%;background:rgba(255,176,0,0.3);transform:translate(-50%,-50%);transition:width 0.6s,height 0.6s}button:hover::before{width:300px;height:300px}button>*{position:relative;z-index:1}.btn-primary{background:rgba(255,176,0,0.1);color:#ffb000;box-shadow:0 0 10px rgba(255,176,0,0.3)}.btn-primary:hover{background:rgba(255,176,0,0.2);box-shadow:0 0 20px rgba(255,176,0,0.6);text-shadow:0 0 10px rgba(255,176,0,0.8)}.btn-secondary{background:rgba(0,0,0,0.8);color:#ffb000;box-shadow:0 0 10px rgba(255,176,0,0.2)}.btn-secondary:hover{background:rgba(255,176,0,0.1);box-shadow:0 0 20px rgba(255,176,0,0.5)}.btn-success{background:rgba(255,176,0,0.2);color:#ffb000;width:100%;justify-content:center;padding:1rem 1.5rem;font-size:1.25rem;box-shadow:0 0 20px rgba(255,176,0,0.4);border:3px solid #ffb000}.btn-success:hover{background:rgba(255,176,0,0.3);box-shadow:0 0 30px rgba(255,176,0,0.7);text-shadow:0 0 15px rgba(255,176,0,1);transform:translateY(-2px)}.btn-download{background:rgba(255,176,0,0.15);color:#ffb000;padding:0.5rem 1rem;font-size:0.875rem}.btn-download:hover{background:rgba(255,176,0,0.25);box-shadow:0 0 15px rgba(255,176,0,0.6)}button:disabled{opacity:0.3;cursor:not-allowed}.library-item{background:rgba(0,0,0,0.6);border:1px solid #ffb000;padding:1rem;margin-bottom:0.75rem;display:flex;align-items:center;gap:1rem;box-shadow:inset 0 0 20px rgba(255,176,0,0.1);transition:all 0.3s}.library-item:hover{box-shadow:inset 0 0 20px rgba(255,176,0,0.2),0 0 15px rgba(255,176,0,0.4);border-color:#ffcc44}.library-item input[type="checkbox"]{width:1.5rem;height:1.5rem;cursor:pointer;accent-color:#ffb000;filter:brightness(1.2) contrast(1.3)}.library-info{flex:1}.library-name{font-weight:500;text-shadow:0 0 5px rgba(255,176,0,0.5);font-size:1.1rem}.library-id{color:#cc8800;font-size:0.8rem;letter-spacing:1px}.type-buttons{display:flex;gap:0.5rem}.type-btn{padding:0.5rem 1.25rem;font-size:0.875rem;background:rgba(0,0,0,0.8);color:#cc8800;border:1px solid #cc8800;transition:all 0.3s}.type-btn.active{background:rgba(255,176,0,0.2);color:#ffb000;border-color:#ffb000;box-shadow:0 0 15px rgba(255,176,0,0.5);text-shadow:0 0 10px rgba(255,176,0,0.8)}.type-btn:hover{border-color:#ffb000;color:#ffb000}.message{padding:1rem;margin-bottom:1.5rem;display:flex;align-items:center;gap:0.75rem;border:2px solid;font-family:'Share Tech Mono',monospace;text-transform:uppercase;letter-spacing:1px}.message.success{background:rgba(255,176,0,0.1);border-color:#ffb000;color:#ffb000;box-shadow:0 0 20px rgba(255,176,0,0.3)}.message.error{background:rgba(255,68,0,0.1);border-color:#ff4400;color:#ff4400;box-shadow:0 0 20px rgba(255,68,0,0.3)}.progress-bar{width:100%;height:1.5rem;background:#000;border:2px solid #ffb000;overflow:hidden;margin-top:0.5rem;box-shadow:inset 0 0 10px rgba(255,176,0,0.2);position:relative}.progress-bar::after{content:"";position:absolute;top:0;left:0;right:0;bottom:0;background:repeating-linear-gradient(90deg,transparent,transparent 10px,rgba(255,176,0,0.1) 10px,rgba(255,176,0,0.1) 20px);pointer-events:none}.progress-fill{height:100%;background:linear-gradient(90deg,#ffb000,#ffcc44,#ffb000);transition:width 0.3s;box-shadow:0 0 20px rgba(255,176,0,0.8);animation:progressGlow 2s infinite}@keyframes progressGlow{0%,100%{box-shadow:0 0 20px rgba(255,176,0,0.8)}50%{box-shadow:0 0 30px rgba(255,176,0,1)}}.progress-text{display:flex;justify-content:space-between;font-size:0.875rem;margin-bottom:0.5rem;text-transform:uppercase;letter-spacing:1px;text-shadow:0 0 5px rgba(255,176,0,0.5)}.report-item{background:rgba(0,0,0,0.6);border:1px solid #ffb000;padding:1rem;margin-bottom:0.75rem;display:flex;align-items:center;justify-content:space-between;box-shadow:inset 0 0 15px rgba(255,176,0,0.1);transition:all 0.3s}.report-item:hover{box-shadow:inset 0 0 20px rgba(255,176,0,0.2),0 0 15px rgba(255,176,0,0.4)}.report-info .name{font-weight:500;font-size:1.1rem;text-shadow:0 0 5px rgba(255,176,0,0.5)}.report-info .details{color:#cc8800;font-size:0.875rem;letter-spacing:1px}.hidden{display:none}.spinner{display:inline-block;width:1rem;height:1rem;border:2px solid rgba(255,176,0,0.3);border-top-color:#ffb000;border-radius:50%;animation:spin 0.6s linear infinite}@keyframes spin{to{transform:rotate(360deg)}}</style></head><body><div class="container"><div class="header"><h1>PLEX UNWATCHED REPORTER</h1><p>[ v2.0 ]</p></div><div id="message" class="message hidden"></div><div class="card"><h2>[ CONFIGURATION ]</h2><div class="form-group"><label>Exclude Content Added Within (days)</label><input type="number" id="excludeDays" value="30" min="0"></div><div class="form-group"><label>Flag As Stale If Unwatched For (days, e.g. 730 = 2 years)</label><input type="number" id="staleDays" value="730" min="0"></div><div class="button-group"><button class="btn-primary" onclick="saveConfig()">Save Configuration</button><button class="btn-secondary" onclick="scanLibraries()" id="scanBtn"><span id="scanIcon">⟳</span><span id="scanText">Scan Libraries</span></button></div></div><div id="librariesCard" class="card hidden"><h2>[ SELECT LIBRARIES ]</h2><div class="info-box"><strong>TYPE SELECTION:</strong> Choose <strong>MOVIE</strong> for single video files (shows title, year, play count). Choose <strong>TV SHOW</strong> for series (shows by season with episode counts).</div><div id="librariesList"></div><button class="btn-success" onclick="generateReports()" id="generateBtn">Generate Reports</button></div><div id="progressCard" class="card hidden"><h2>[ PROCESSING ]</h2><div class="progress-text"><span id="progressLibrary"></span><span id="progressCount"></span></div><div class="progress-bar"><div class="progress-fill" id="progressFill"></div></div></div><div id="reportsCard" class="card hidden"><h2>[ GENERATED REPORTS ]</h2><div id="reportsList"></div><button class="btn-secondary" onclick="clearReports()" id="clearBtn" style="margin-top:1rem;width:100%">Clear All Reports</button></div><div class="card"><h2>[ POWER MANAGEMENT ]</h2><div class="info-box"><strong>WARNING:</strong> Shutting down will stop the container. You will need to restart it from your Docker/Unraid interface to use it again.</div><button class="btn-secondary" onclick="shutdownContainer()" id="shutdownBtn" style="width:100%;background:rgba(255,68,0,0.2);border-color:#ff4400;color:#ff4400">SHUTDOWN APPLICATION AND STOP CONTAINER</button></div></div><script>let config={};let libraries=[];let selectedLibraries={};let libraryTypes={};let progressInterval=null;window.onload=async()=>{await loadConfig()};async function loadConfig(){try{const r=await fetch('/api/config');const d=await r.json();document.getElementById('excludeDays').value=d.excludeDays||30;document.getElementById('staleDays').value=d.staleDays||730;selectedLibraries=d.selectedLibraries||{};libraryTypes=d.libraryTypes||{}}catch(e){console.error('Failed:',e)}}async function saveConfig(){config={excludeDays:parseInt(document.getElementById('excludeDays').value),staleDays:parseInt(document.getElementById('staleDays').value),selectedLibraries:selectedLibraries,libraryTypes:libraryTypes};try{await fetch('/api/config',{method:'POST',headers:{'Content-Type':'application/json'},body:JSON.stringify(config)});showMessage('success','Configuration saved!')}catch(e){showMessage('error','Failed to save')}}async function scanLibraries(){const btn=document.getElementById('scanBtn');const icon=document.getElementById('scanIcon');const text=document.getElementById('scanText');btn.disabled=true;icon.innerHTML='<span class="spinner"></span>';text.textContent='Scanning...';try{await saveConfig();const r=await fetch('/api/libraries');const d=await r.json();if(d.error){showMessage('error',d.error);return}libraries=d.libraries;libraries.forEach(lib=>{if(!(lib.key in selectedLibraries)){selectedLibraries[lib.key]=false;libraryTypes[lib.key]=lib.type==='show'?'tv':'movie'}});renderLibraries();document.getElementById('librariesCard').classList.remove('hidden');showMessage('success',`Found ${libraries.length} libraries`)}catch(e){showMessage('error','Failed to scan')}finally{btn.disabled=false;icon.textContent='⟳';text.textContent='Scan Libraries'}}function renderLibraries(){const list=document.getElementById('librariesList');list.innerHTML=libraries.map(lib=>`<div class="library-item"><input type="checkbox" id="lib_${lib.key}" ${selectedLibraries[lib.key]?'checked':''} onchange="toggleLibrary('${lib.key}')"><div class="library-info"><div class="library-name">${lib.title}</div><div class="library-id">Type: ${lib.type}</div></div><div class="type-buttons"><button class="type-btn ${libraryTypes[lib.key]==='movie'?'active':''}" onclick="setLibraryType('${lib.key}','movie')">Movie</button><button class="type-btn ${libraryTypes[lib.key]==='tv'?'active':''}" onclick="setLibraryType('${lib.key}','tv')">TV Show</button></div></div>`).join('')}function toggleLibrary(key){selectedLibraries[key]=!selectedLibraries[key]}function setLibraryType(key,type){libraryTypes[key]=type;renderLibraries()}async function pollProgress(){try{const r=await fetch('/api/progress');const data=await r.json();let libraryText='Initializing...';if(data.current_library){if(data.total_items>0){libraryText=`Processing: ${data.current_library} - Item ${data.current_item}/${data.total_items}`}else{libraryText=`Processing: ${data.current_library}`}}document.getElementById('progressLibrary').textContent=libraryText;document.getElementById('progressCount').textContent=`${data.current} / ${data.total}`;const percent=data.total>0?(data.current/data.total)*100:0;document.getElementById('progressFill').style.width=`${percent}%`}catch(e){console.error('Progress poll failed:',e)}}async function generateReports(){const selectedCount=Object.values(selectedLibraries).filter(Boolean).length;if(selectedCount===0){showMessage('error','Select at least one library');return}await saveConfig();const btn=document.getElementById('generateBtn');btn.disabled=true;document.getElementById('progressCard').classList.remove('hidden');document.getElementById('reportsCard').classList.add('hidden');document.getElementById('progressLibrary').textContent='Initializing...';document.getElementById('progressCount').textContent='0 / 0';document.getElementById('progressFill').style.width='0%';const librariesOrder=libraries.map(lib=>lib.key);progressInterval=setInterval(pollProgress,500);try{const r=await fetch('/api/generate',{method:'POST',headers:{'Content-Type':'application/json'},body:JSON.stringify({selectedLibraries:selectedLibraries,libraryTypes:libraryTypes,librariesOrder:librariesOrder})});const d=await r.json();if(progressInterval){clearInterval(progressInterval);progressInterval=null}if(d.error){showMessage('error',d.error);return}renderReports(d.reports);document.getElementById('progressCard').classList.add('hidden');document.getElementById('reportsCard').classList.remove('hidden');showMessage('success',`Generated ${d.reports.length} reports!`)}catch(e){if(progressInterval){clearInterval(progressInterval);progressInterval=null}showMessage('error','Generation failed')}finally{btn.disabled=false}}function renderReports(reports){const list=document.getElementById('reportsList');list.innerHTML=reports.map(report=>`<div class="report-item"><div class="report-info"><div class="name">${report.library}</div><div class="details">${report.filename} • ${report.itemCount} items</div></div><button class="btn-download" onclick="downloadReport('${report.filename}')">[ DOWNLOAD ]</button></div>`).join('')}function downloadReport(filename){window.location.href=`/api/download/${filename}`}function showMessage(type,text){const msg=document.getElementById('message');msg.className=`message ${type}`;msg.innerHTML=`<span>${type==='success'?'[OK]':'[ERROR]'}</span><span>${text}</span>`;msg.classList.remove('hidden');setTimeout(()=>{msg.classList.add('hidden')},5000)}async function clearReports(){if(!confirm('Delete all report files? This cannot be undone.')){return}const btn=document.getElementById('clearBtn');btn.disabled=true;btn.textContent='Clearing...';try{const r=await fetch('/api/clear-reports',{method:'POST'});const d=await r.json();if(d.error){showMessage('error',d.error)}else{showMessage('success',`Deleted ${d.deleted} report files`);document.getElementById('reportsCard').classList.add('hidden')}}catch(e){showMessage('error','Failed to clear reports')}finally{btn.disabled=false;btn.textContent='Clear All Reports'}}async function shutdownContainer(){if(!confirm('Really shutdown the container? You will need to restart it manually.')){return}const btn=document.getElementById('shutdownBtn');btn.disabled=true;btn.textContent='Shutting down...';try{await fetch('/api/shutdown',{method:'POST'});showMessage('success','Container shutting down...')}catch(e){showMessage('error','Shutdown failed')}}</script></body></html>
+HTML_TEMPLATE = """<!DOCTYPE html><html lang="en"><head><meta charset="UTF-8"><meta name="viewport" content="width=device-width, initial-scale=1.0"><title>Plex Unwatched Reporter</title><style>@import url('https://fonts.googleapis.com/css2?family=Share+Tech+Mono&display=swap');*{margin:0;padding:0;box-sizing:border-box}body{font-family:'Share Tech Mono','Courier New',monospace;background:#000;color:#ffb000;padding:2rem;min-height:100vh;position:relative;overflow-x:hidden;background-image:linear-gradient(rgba(255,176,0,0.03) 1px,transparent 1px),linear-gradient(90deg,rgba(255,176,0,0.03) 1px,transparent 1px);background-size:50px 50px}body::before{content:"";position:fixed;top:0;left:0;width:100%;height:100%;background:repeating-linear-gradient(0deg,rgba(0,0,0,0.15),rgba(0,0,0,0.15) 1px,transparent 1px,transparent 2px);pointer-events:none;z-index:1000}body::after{content:"";position:fixed;top:0;left:0;width:100%;height:100%;background:radial-gradient(ellipse at center,rgba(255,176,0,0.1) 0%,transparent 70%);pointer-events:none;z-index:999}.container{max-width:1200px;margin:0 auto;position:relative;z-index:1}.header{margin-bottom:2rem;text-align:center;border:2px solid #ffb000;padding:1.5rem;background:rgba(255,176,0,0.05);box-shadow:0 0 20px rgba(255,176,0,0.3),inset 0 0 20px rgba(255,176,0,0.1);position:relative}.header::before{content:"▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲";position:absolute;top:-12px;left:50%;transform:translateX(-50%);background:#000;padding:0 10px;font-size:0.5rem;letter-spacing:2px}.header h1{font-size:2.5rem;margin-bottom:0.5rem;text-shadow:0 0 10px rgba(255,176,0,0.8),0 0 20px rgba(255,176,0,0.6),0 0 30px rgba(255,176,0,0.4);letter-spacing:3px;animation:flicker 3s infinite alternate}@keyframes flicker{0%,100%{opacity:1}41.99%{opacity:1}42%{opacity:0.8}43%{opacity:1}45.99%{opacity:1}46%{opacity:0.85}46.5%{opacity:1}}.header p{color:#cc8800;text-transform:uppercase;letter-spacing:2px;font-size:0.9rem}.card{background:rgba(0,0,0,0.8);border:2px solid #ffb000;padding:1.5rem;margin-bottom:1.5rem;box-shadow:0 0 20px rgba(255,176,0,0.3),inset 0 0 40px rgba(255,176,0,0.05);position:relative}.card::before{content:"";position:absolute;top:0;left:0;right:0;height:1px;background:linear-gradient(90deg,transparent,#ffb000,transparent);opacity:0.5}.card h2{font-size:1.5rem;margin-bottom:1rem;text-transform:uppercase;letter-spacing:3px;text-shadow:0 0 10px rgba(255,176,0,0.8);border-bottom:1px solid #ffb000;padding-bottom:0.5rem}.info-box{background:rgba(255,176,0,0.05);border-left:3px solid #ffb000;padding:0.75rem 1rem;margin-bottom:1.5rem;font-size:0.875rem;letter-spacing:1px;line-height:1.6}.form-group{margin-bottom:1rem}label{display:block;font-size:0.875rem;font-weight:500;margin-bottom:0.5rem;text-transform:uppercase;letter-spacing:1px;color:#ffb000}input[type="text"],input[type="number"]{width:100%;background:#000;border:2px solid #ffb000;color:#ffb000;padding:0.75rem 1rem;font-size:1rem;font-family:'Share Tech Mono',monospace;box-shadow:inset 0 0 10px rgba(255,176,0,0.2)}input[type="text"]:focus,input[type="number"]:focus{outline:none;box-shadow:inset 0 0 10px rgba(255,176,0,0.3),0 0 15px rgba(255,176,0,0.5);animation:pulse 1.5s infinite}@keyframes pulse{0%,100%{border-color:#ffb000}50%{border-color:#ffcc44}}.button-group{display:flex;gap:0.75rem;flex-wrap:wrap}button{padding:0.75rem 1.5rem;border:2px solid #ffb000;font-weight:500;cursor:pointer;font-size:1rem;font-family:'Share Tech Mono',monospace;transition:all 0.2s;display:flex;align-items:center;gap:0.5rem;text-transform:uppercase;letter-spacing:2px;position:relative;overflow:hidden}button::before{content:"";position:absolute;top:50%;left:50%;width:0;height:0;border-radius:50%;background:rgba(255,176,0,0.3);transform:translate(-50%,-50%);transition:width 0.6s,height 0.6s}button:hover::before{width:300px;height:300px}button>*{position:relative;z-index:1}.btn-primary{background:rgba(255,176,0,0.1);color:#ffb000;box-shadow:0 0 10px rgba(255,176,0,0.3)}.btn-primary:hover{background:rgba(255,176,0,0.2);box-shadow:0 0 20px rgba(255,176,0,0.6);text-shadow:0 0 10px rgba(255,176,0,0.8)}.btn-secondary{background:rgba(0,0,0,0.8);color:#ffb000;box-shadow:0 0 10px rgba(255,176,0,0.2)}.btn-secondary:hover{background:rgba(255,176,0,0.1);box-shadow:0 0 20px rgba(255,176,0,0.5)}.btn-success{background:rgba(255,176,0,0.2);color:#ffb000;width:100%;justify-content:center;padding:1rem 1.5rem;font-size:1.25rem;box-shadow:0 0 20px rgba(255,176,0,0.4);border:3px solid #ffb000}.btn-success:hover{background:rgba(255,176,0,0.3);box-shadow:0 0 30px rgba(255,176,0,0.7);text-shadow:0 0 15px rgba(255,176,0,1);transform:translateY(-2px)}.btn-download{background:rgba(255,176,0,0.15);color:#ffb000;padding:0.5rem 1rem;font-size:0.875rem}.btn-download:hover{background:rgba(255,176,0,0.25);box-shadow:0 0 15px rgba(255,176,0,0.6)}button:disabled{opacity:0.3;cursor:not-allowed}.library-item{background:rgba(0,0,0,0.6);border:1px solid #ffb000;padding:1rem;margin-bottom:0.75rem;display:flex;align-items:center;gap:1rem;box-shadow:inset 0 0 20px rgba(255,176,0,0.1);transition:all 0.3s}.library-item:hover{box-shadow:inset 0 0 20px rgba(255,176,0,0.2),0 0 15px rgba(255,176,0,0.4);border-color:#ffcc44}.library-item input[type="checkbox"]{width:1.5rem;height:1.5rem;cursor:pointer;accent-color:#ffb000;filter:brightness(1.2) contrast(1.3)}.library-info{flex:1}.library-name{font-weight:500;text-shadow:0 0 5px rgba(255,176,0,0.5);font-size:1.1rem}.library-id{color:#cc8800;font-size:0.8rem;letter-spacing:1px}.type-buttons{display:flex;gap:0.5rem}.type-btn{padding:0.5rem 1.25rem;font-size:0.875rem;background:rgba(0,0,0,0.8);color:#cc8800;border:1px solid #cc8800;transition:all 0.3s}.type-btn.active{background:rgba(255,176,0,0.2);color:#ffb000;border-color:#ffb000;box-shadow:0 0 15px rgba(255,176,0,0.5);text-shadow:0 0 10px rgba(255,176,0,0.8)}.type-btn:hover{border-color:#ffb000;color:#ffb000}.message{padding:1rem;margin-bottom:1.5rem;display:flex;align-items:center;gap:0.75rem;border:2px solid;font-family:'Share Tech Mono',monospace;text-transform:uppercase;letter-spacing:1px}.message.success{background:rgba(255,176,0,0.1);border-color:#ffb000;color:#ffb000;box-shadow:0 0 20px rgba(255,176,0,0.3)}.message.error{background:rgba(255,68,0,0.1);border-color:#ff4400;color:#ff4400;box-shadow:0 0 20px rgba(255,68,0,0.3)}.progress-bar{width:100%;height:1.5rem;background:#000;border:2px solid #ffb000;overflow:hidden;margin-top:0.5rem;box-shadow:inset 0 0 10px rgba(255,176,0,0.2);position:relative}.progress-bar::after{content:"";position:absolute;top:0;left:0;right:0;bottom:0;background:repeating-linear-gradient(90deg,transparent,transparent 10px,rgba(255,176,0,0.1) 10px,rgba(255,176,0,0.1) 20px);pointer-events:none}.progress-fill{height:100%;background:linear-gradient(90deg,#ffb000,#ffcc44,#ffb000);transition:width 0.3s;box-shadow:0 0 20px rgba(255,176,0,0.8);animation:progressGlow 2s infinite}@keyframes progressGlow{0%,100%{box-shadow:0 0 20px rgba(255,176,0,0.8)}50%{box-shadow:0 0 30px rgba(255,176,0,1)}}.progress-text{display:flex;justify-content:space-between;font-size:0.875rem;margin-bottom:0.5rem;text-transform:uppercase;letter-spacing:1px;text-shadow:0 0 5px rgba(255,176,0,0.5)}.report-item{background:rgba(0,0,0,0.6);border:1px solid #ffb000;padding:1rem;margin-bottom:0.75rem;display:flex;align-items:center;justify-content:space-between;box-shadow:inset 0 0 15px rgba(255,176,0,0.1);transition:all 0.3s}.report-item:hover{box-shadow:inset 0 0 20px rgba(255,176,0,0.2),0 0 15px rgba(255,176,0,0.4)}.report-info .name{font-weight:500;font-size:1.1rem;text-shadow:0 0 5px rgba(255,176,0,0.5)}.report-info .details{color:#cc8800;font-size:0.875rem;letter-spacing:1px}.hidden{display:none}.spinner{display:inline-block;width:1rem;height:1rem;border:2px solid rgba(255,176,0,0.3);border-top-color:#ffb000;border-radius:50%;animation:spin 0.6s linear infinite}@keyframes spin{to{transform:rotate(360deg)}}</style></head><body><div class="container"><div class="header"><h1>PLEX UNWATCHED REPORTER</h1><p>[ v2.0 ]</p></div><div id="message" class="message hidden"></div><div class="card"><h2>[ CONFIGURATION ]</h2><div class="form-group"><label>Exclude Content Added Within (days)</label><input type="number" id="excludeDays" value="30" min="0"></div><div class="form-group"><label>Flag As Stale If Unwatched For (days, e.g. 730 = 2 years)</label><input type="number" id="staleDays" value="730" min="0"></div><div class="button-group"><button class="btn-primary" onclick="saveConfig()">Save Configuration</button><button class="btn-secondary" onclick="scanLibraries()" id="scanBtn"><span id="scanIcon">⟳</span><span id="scanText">Scan Libraries</span></button></div></div><div id="librariesCard" class="card hidden"><h2>[ SELECT LIBRARIES ]</h2><div class="info-box"><strong>TYPE SELECTION:</strong> Choose <strong>MOVIE</strong> for single video files (shows title, year, play count). Choose <strong>TV SHOW</strong> for series (shows by season with episode counts).</div><div id="librariesList"></div><button class="btn-success" onclick="generateReports()" id="generateBtn">Generate Reports</button></div><div id="progressCard" class="card hidden"><h2>[ PROCESSING ]</h2><div class="progress-text"><span id="progressLibrary"></span><span id="progressCount"></span></div><div class="progress-bar"><div class="progress-fill" id="progressFill"></div></div><div class="library-id" id="progressLibraries" style="margin-top:0.5rem"></div><button class="btn-secondary" onclick="cancelJob()" id="cancelBtn" style="margin-top:1rem;width:100%">Cancel</button></div><div id="reportsCard" class="card hidden"><h2>[ GENERATED REPORTS ]</h2><div id="reportsList"></div><button class="btn-secondary" onclick="clearReports()" id="clearBtn" style="margin-top:1rem;width:100%">Clear All Reports</button></div><div class="card"><h2>[ POWER MANAGEMENT ]</h2><div class="info-box"><strong>WARNING:</strong> Shutting down will stop the container. You will need to restart it from your Docker/Unraid interface to use it again.</div><button class="btn-secondary" onclick="shutdownContainer()" id="shutdownBtn" style="width:100%;background:rgba(255,68,0,0.2);border-color:#ff4400;color:#ff4400">SHUTDOWN APPLICATION AND STOP CONTAINER</button></div></div><script>let config={};let libraries=[];let selectedLibraries={};let libraryTypes={};let progressInterval=null;let currentJobId=null;window.onload=async()=>{await loadConfig();await loadLibraries();await resumeJob()};async function loadLibraries(){try{const r=await fetch('/api/libraries?cached=1');const d=await r.json();if(!d.error&&d.scanned){applyLibraries(d.libraries)}}catch(e){console.error('Failed:',e)}}function applyLibraries(list){libraries=list;libraries.forEach(lib=>{if(!(lib.key in selectedLibraries)){selectedLibraries[lib.key]=false;libraryTypes[lib.key]=lib.type==='show'?'tv':'movie'}});renderLibraries();document.getElementById('librariesCard').classList.remove('hidden')}async function resumeJob(){const jobId=sessionStorage.getItem('reportJobId');if(!jobId){return}try{const r=await fetch(`/api/progress/${jobId}`);if(!r.ok){sessionStorage.removeItem('reportJobId');return}const d=await r.json();if(d.status==='queued'||d.status==='running'){currentJobId=jobId;document.getElementById('generateBtn').disabled=true;document.getElementById('progressCard').classList.remove('hidden');progressInterval=setInterval(pollProgress,500)}}catch(e){console.error('Failed:',e)}}async function loadConfig(){try{const r=await fetch('/api/config');const d=await r.json();document.getElementById('excludeDays').value=d.excludeDays||30;document.getElementById('staleDays').value=d.staleDays||730;selectedLibraries=d.selectedLibraries||{};libraryTypes=d.libraryTypes||{}}catch(e){console.error('Failed:',e)}}async function saveConfig(){config={excludeDays:parseInt(document.getElementById('excludeDays').value),staleDays:parseInt(document.getElementById('staleDays').value),selectedLibraries:selectedLibraries,libraryTypes:libraryTypes};try{await fetch('/api/config',{method:'POST',headers:{'Content-Type':'application/json'},body:JSON.stringify(config)});showMessage('success','Configuration saved!')}catch(e){showMessage('error','Failed to save')}}async function scanLibraries(){const btn=document.getElementById('scanBtn');const icon=document.getElementById('scanIcon');const text=document.getElementById('scanText');btn.disabled=true;icon.innerHTML='<span class="spinner"></span>';text.textContent='Scanning...';try{await saveConfig();const r=await fetch('/api/libraries?refresh=1');const d=await r.json();if(d.error){showMessage('error',d.error);return}applyLibraries(d.libraries);showMessage('success',`Found ${libraries.length} libraries`)}catch(e){showMessage('error','Failed to scan')}finally{btn.disabled=false;icon.textContent='⟳';text.textContent='Scan Libraries'}}function renderLibraries(){const list=document.getElementById('librariesList');list.innerHTML=libraries.map(lib=>`<div class="library-item"><input type="checkbox" id="lib_${lib.key}" ${selectedLibraries[lib.key]?'checked':''} onchange="toggleLibrary('${lib.key}')"><div class="library-info"><div class="library-name">${lib.title}</div><div class="library-id">Type: ${lib.type}${lib.count!=null?` • ${lib.count} items`:''}</div></div><div class="type-buttons"><button class="type-btn ${libraryTypes[lib.key]==='movie'?'active':''}" onclick="setLibraryType('${lib.key}','movie')">Movie</button><button class="type-btn ${libraryTypes[lib.key]==='tv'?'active':''}" onclick="setLibraryType('${lib.key}','tv')">TV Show</button></div></div>`).join('')}function toggleLibrary(key){selectedLibraries[key]=!selectedLibraries[key]}function setLibraryType(key,type){libraryTypes[key]=type;renderLibraries()}async function pollProgress(){if(!currentJobId){return}try{const r=await fetch(`/api/progress/${currentJobId}`);const data=await r.json();if(data.error){stopPolling();currentJobId=null;sessionStorage.removeItem('reportJobId');showMessage('error',data.error);return}let libraryText='Initializing...';if(data.status==='queued'){libraryText='Waiting for another report job to finish...'}else if(data.current_library){const running=Object.values(data.libraries||{}).filter(lib=>lib.status==='running');if(running.length>1){libraryText=`Processing ${running.length} libraries`}else if(data.total_items>0){libraryText=`Processing: ${data.current_library} - Item ${data.current_item}/${data.total_items}`}else{libraryText=`Processing: ${data.current_library}`}}document.getElementById('progressLibrary').textContent=libraryText;document.getElementById('progressCount').textContent=`${data.current} / ${data.total}`;const libs=(data.libraries_order||[]).map(key=>(data.libraries||{})[key]).filter(Boolean);const done=libs.reduce((sum,lib)=>sum+(lib.status==='done'?1:(lib.total_items>0?lib.current_item/lib.total_items:0)),0);const percent=libs.length>0?(done/libs.length)*100:(data.total>0?(data.current/data.total)*100:0);document.getElementById('progressFill').style.width=`${percent}%`;document.getElementById('progressLibraries').innerHTML=libs.length>1?libs.map(lib=>`<div>${lib.title||'Library'}: ${lib.status==='running'&&lib.total_items>0?`${lib.current_item}/${lib.total_items}`:lib.status}</div>`).join(''):'';if(['completed','failed','cancelled'].includes(data.status)){await finishJob(currentJobId)}}catch(e){console.error('Progress poll failed:',e)}}function stopPolling(){if(progressInterval){clearInterval(progressInterval);progressInterval=null}document.getElementById('generateBtn').disabled=false}async function finishJob(jobId){stopPolling();currentJobId=null;sessionStorage.removeItem('reportJobId');document.getElementById('progressCard').classList.add('hidden');const r=await fetch(`/api/jobs/${jobId}`);const job=await r.json();if(job.status==='completed'){renderReports(job.result.reports,job.result.summary);document.getElementById('reportsCard').classList.remove('hidden');showMessage('success',`Generated ${job.result.reports.length} reports!`)}else if(job.status==='cancelled'){showMessage('error','Report generation cancelled')}else{showMessage('error',job.error||'Generation failed')}}async function cancelJob(){if(!currentJobId){return}const btn=document.getElementById('cancelBtn');btn.disabled=true;try{await fetch(`/api/jobs/${currentJobId}/cancel`,{method:'POST'})}catch(e){showMessage('error','Failed to cancel')}finally{btn.disabled=false}}async function generateReports(){const selectedCount=Object.values(selectedLibraries).filter(Boolean).length;if(selectedCount===0){showMessage('error','Select at least one library');return}await saveConfig();const btn=document.getElementById('generateBtn');btn.disabled=true;document.getElementById('progressCard').classList.remove('hidden');document.getElementById('reportsCard').classList.add('hidden');document.getElementById('progressLibrary').textContent='Initializing...';document.getElementById('progressCount').textContent='0 / 0';document.getElementById('progressFill').style.width='0%';document.getElementById('progressLibraries').innerHTML='';const librariesOrder=libraries.map(lib=>lib.key);try{const r=await fetch('/api/generate',{method:'POST',headers:{'Content-Type':'application/json'},body:JSON.stringify({selectedLibraries:selectedLibraries,libraryTypes:libraryTypes,librariesOrder:librariesOrder})});const d=await r.json();if(d.error){stopPolling();showMessage('error',d.error);return}currentJobId=d.jobId;sessionStorage.setItem('reportJobId',d.jobId);progressInterval=setInterval(pollProgress,500)}catch(e){stopPolling();showMessage('error','Generation failed')}}function renderReports(reports,summary){const list=document.getElementById('reportsList');list.innerHTML=(summary?`<div class="report-item"><div class="report-info"><div class="name">Space Summary</div><div class="details">${summary.filename} • ${formatBytes(summary.totals.reclaimableBytes)} reclaimable (Stale + Never Watched)</div></div><button class="btn-download" onclick="downloadReport('${summary.filename}')">[ DOWNLOAD ]</button></div>`:'')+reports.map(report=>`<div class="report-item"><div class="report-info"><div class="name">${report.library}</div><div class="details">${report.filename} • ${report.itemCount} items</div></div><div class="button-group">${report.changes?`<button class="btn-download" onclick="downloadReport('${report.changes.filename}')">[ ${report.changes.count} CHANGES ]</button>`:''}${(report.exports||[]).map(exp=>`<button class="btn-download" onclick="downloadReport('${exp.filename}')">[ ${exp.format.toUpperCase()} ]</button>`).join('')}<button class="btn-download" onclick="downloadReport('${report.filename}')">[ DOWNLOAD ]</button></div></div>`).join('')}function formatBytes(bytes){const units=['B','KB','MB','GB','TB','PB'];let i=0;while(bytes>=1024&&i<units.length-1){bytes/=1024;i++}return `${bytes.toFixed(2)} ${units[i]}`}function downloadReport(filename){window.location.href=`/api/download/${filename}`}function showMessage(type,text){const msg=document.getElementById('message');msg.className=`message ${type}`;msg.innerHTML=`<span>${type==='success'?'[OK]':'[ERROR]'}</span><span>${text}</span>`;msg.classList.remove('hidden');setTimeout(()=>{msg.classList.add('hidden')},5000)}async function clearReports(){if(!confirm('Delete all report files? This cannot be undone.')){return}const btn=document.getElementById('clearBtn');btn.disabled=true;btn.textContent='Clearing...';try{const r=await fetch('/api/clear-reports',{method:'POST'});const d=await r.json();if(d.error){showMessage('error',d.error)}else{showMessage('success',`Deleted ${d.deleted} report files`);document.getElementById('reportsCard').classList.add('hidden')}}catch(e){showMessage('error','Failed to clear reports')}finally{btn.disabled=false;btn.textContent='Clear All Reports'}}async function shutdownContainer(){if(!confirm('Really shutdown the container? You will need to restart it manually.')){return}const btn=document.getElementById('shutdownBtn');btn.disabled=true;btn.textContent='Shutting down...';try{await fetch('/api/shutdown',{method:'POST'});showMessage('success','Container shutting down...')}catch(e){showMessage('error','Shutdown failed')}}</script></body></html>
 """
 
 def load_config():
@@ -57,11 +91,475 @@ def save_config(config):
     with open(CONFIG_FILE,'w') as f:
         json.dump(config,f,indent=2)
 
-def get_plex_connection():
+def get_plex_connection(session=None):
     """Connect to Plex server using PlexAPI - SAFE, no database access"""
     if not PLEX_URL or not PLEX_TOKEN:
         raise ValueError('PLEX_URL and PLEX_TOKEN environment variables are required')
-    return PlexServer(PLEX_URL, PLEX_TOKEN)
+    return PlexServer(PLEX_URL, PLEX_TOKEN, session=session)
+
+# Default number of concurrent requests made to a Plex server
+PLEX_WORKERS = int(os.environ.get('PLEX_WORKERS', '4'))
+# Responses slower than this (seconds) count as a sign the server is struggling
+SLOW_RESPONSE_SECONDS = 2.0
+
+def get_worker_limit(config, server_url):
+    """Concurrent request limit for a server - `serverWorkers` in config.json overrides `plexWorkers`"""
+    per_server = config.get('serverWorkers', {})
+    workers = per_server.get(server_url, config.get('plexWorkers', PLEX_WORKERS))
+    return max(1, int(workers))
+
+class ThrottledSession(requests.Session):
+    """Pooled HTTP session for one Plex server - retries failed GETs and adapts how many run at once"""
+
+    def __init__(self, max_workers):
+        super().__init__()
+        self.max_workers = max_workers
+        self.limit = float(max_workers)
+        self.active = 0
+        self._cond = threading.Condition()
+
+        retry = Retry(total=3, backoff_factor=0.5, status_forcelist=(500, 502, 503, 504),
+                      allowed_methods=frozenset(['GET', 'HEAD']))
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers, max_retries=retry)
+        self.mount('http://', adapter)
+        self.mount('https://', adapter)
+
+    def request(self, method, url, *args, **kwargs):
+        with self._cond:
+            while self.active >= max(1, int(self.limit)):
+                self._cond.wait()
+            self.active += 1
+        response = None
+        started = time.perf_counter()
+        try:
+            response = super().request(method, url, *args, **kwargs)
+            return response
+        finally:
+            record_request(url, response.status_code if response is not None else 'error',
+                           time.perf_counter() - started)
+            with self._cond:
+                self.active -= 1
+                self._adapt(response)
+                self._cond.notify_all()
+
+    def _adapt(self, response):
+        # urllib3 retries 5xx responses internally, so look at its retry history too
+        retries = getattr(getattr(response, 'raw', None), 'retries', None)
+        if response is None or response.status_code >= 500 or getattr(retries, 'history', None) or \
+                response.elapsed.total_seconds() > SLOW_RESPONSE_SECONDS:
+            self.limit = max(1.0, self.limit / 2)
+        else:
+            self.limit = min(float(self.max_workers), self.limit + 1.0 / self.limit)
+
+class PlexFetcher:
+    """Bounded thread pool for Plex I/O whose map() yields results in input order"""
+
+    def __init__(self, max_workers=PLEX_WORKERS):
+        self.max_workers = max(1, int(max_workers))
+        self.session = ThrottledSession(self.max_workers)
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def map(self, fn, items):
+        if self.max_workers == 1:
+            yield from map(fn, items)
+            return
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='plex-fetch')
+
+        window = deque()
+        try:
+            for item in items:
+                # Run each call in a copy of this thread's context so report stats follow it
+                window.append(self._executor.submit(contextvars.copy_context().run, fn, item))
+                if len(window) >= self.max_workers * 2:
+                    yield window.popleft().result()
+            while window:
+                yield window.popleft().result()
+        finally:
+            for future in window:
+                future.cancel()
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def fetch_map(fetcher, fn, items):
+    """Run fn over items through the fetcher's thread pool, or sequentially without one"""
+    return fetcher.map(fn, items) if fetcher else map(fn, items)
+
+# Errors after which a cached connection is thrown away and rebuilt on next use
+RECONNECT_ERRORS = (requests.exceptions.ConnectionError, requests.exceptions.Timeout, Unauthorized)
+
+class PlexConnection:
+    """A PlexServer plus the fetcher (pooled session and thread pool) it talks through"""
+
+    def __init__(self, url, token, workers):
+        self.key = (url, token, workers)
+        self.fetcher = PlexFetcher(workers)
+        try:
+            self.plex = get_plex_connection(session=self.fetcher.session)
+        except Exception:
+            self.fetcher.close()
+            raise
+        self.users = 0
+        self.retired = False
+        self.libraries = None  # (expires at, section listing)
+        self.sections = None  # section key -> LibrarySection
+
+    def section(self, key):
+        """Library section by key - reloads the section list once if it is not known yet"""
+        sections = self.sections
+        if sections is None or str(key) not in sections:
+            sections = self.reload_sections()
+        try:
+            return sections[str(key)]
+        except KeyError:
+            raise NotFound(f'Invalid library sectionID: {key}') from None
+
+    def reload_sections(self):
+        """Re-list /library/sections, replacing the section objects held so far.
+
+        plexapi's own server.library keeps its section list for the life of
+        the server object, so a fresh Library is read instead.
+        """
+        library = Library(self.plex, self.plex.query('/library'))
+        self.sections = {str(section.key): section for section in library.sections()}
+        return self.sections
+
+    def close(self):
+        self.fetcher.close()
+
+class PlexConnectionManager:
+    """Long-lived Plex connection shared by the UI and every report job.
+
+    The PlexServer handshake and its pooled session are reused until
+    PLEX_URL, PLEX_TOKEN or the worker limit change, or a connection error
+    or 401 shows the server went away - then the next lease reconnects.
+    A replaced connection is only closed once the last job using it is done.
+    The section listing is cached for LIBRARY_CACHE_TTL seconds.
+    """
+
+    def __init__(self, ttl=None):
+        self.ttl = ttl
+        self._current = None
+        self._lock = threading.Lock()
+
+    def _settings(self):
+        return PLEX_URL, PLEX_TOKEN, get_worker_limit(load_config(), PLEX_URL)
+
+    def _retire(self, conn):
+        # Caller holds the lock
+        conn.retired = True
+        if self._current is conn:
+            self._current = None
+        if conn.users == 0:
+            conn.close()
+
+    @contextmanager
+    def lease(self):
+        """Borrow the shared connection, connecting (or reconnecting) if needed"""
+        settings = self._settings()
+        with self._lock:
+            conn = self._current
+            if conn is not None and conn.key != settings:
+                self._retire(conn)
+                conn = None
+            if conn is None:
+                conn = self._current = PlexConnection(*settings)
+            conn.users += 1
+        try:
+            yield conn
+        except RECONNECT_ERRORS:
+            self.invalidate(conn)
+            raise
+        finally:
+            with self._lock:
+                conn.users -= 1
+                if conn.retired and conn.users == 0:
+                    conn.close()
+
+    def invalidate(self, conn=None):
+        """Drop the current connection (or `conn`, if it is still current)"""
+        with self._lock:
+            if self._current is not None and conn in (None, self._current):
+                self._retire(self._current)
+
+    def cached_libraries(self):
+        """Last section listing of the current connection, even if expired - None without
+        connecting to Plex when the libraries haven't been listed yet"""
+        settings = self._settings()
+        with self._lock:
+            conn = self._current
+            if conn is None or conn.key != settings or conn.libraries is None:
+                return None
+            return conn.libraries[1]
+
+    def libraries(self, refresh=False):
+        """Section listing (key/title/type/item count), cached for LIBRARY_CACHE_TTL seconds"""
+        ttl = LIBRARY_CACHE_TTL if self.ttl is None else self.ttl
+        for attempt in range(2):
+            try:
+                with self.lease() as conn:
+                    cached = conn.libraries
+                    if cached and not refresh and cached[0] > time.monotonic():
+                        return cached[1]
+                    sections = list(conn.reload_sections().values())
+                    counts = conn.fetcher.map(lambda section: section.totalSize, sections)
+                    listing = [{'key': section.key, 'title': section.title, 'type': section.type, 'count': count}
+                               for section, count in zip(sections, counts)]
+                    conn.libraries = (time.monotonic() + ttl, listing)
+                    return listing
+            except RECONNECT_ERRORS:
+                # A pooled connection may have gone stale - retry once on a fresh one
+                if attempt:
+                    raise
+
+plex_connections = PlexConnectionManager()
+
+# Upper bounds (seconds) of the Plex request latency histogram buckets
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class Metrics:
+    """Process-wide counters behind /api/metrics (Prometheus text format)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.phase_seconds = Counter()
+        self.requests = Counter()  # (endpoint, status) -> count
+        self.latency_buckets = defaultdict(lambda: [0] * len(LATENCY_BUCKETS))
+        self.latency_sum = Counter()
+        self.latency_count = Counter()
+        self.reports = Counter()  # library type -> reports generated
+        self.report_seconds = Counter()
+        self.items = Counter()
+        self.items_per_second = {}  # library title -> throughput of its last report
+
+    def observe_phase(self, phase, seconds):
+        with self._lock:
+            self.phase_seconds[phase] += seconds
+
+    def observe_request(self, endpoint, status, seconds):
+        with self._lock:
+            self.requests[(endpoint, status)] += 1
+            buckets = self.latency_buckets[endpoint]
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if seconds <= bound:
+                    buckets[i] += 1
+            self.latency_sum[endpoint] += seconds
+            self.latency_count[endpoint] += 1
+
+    def observe_report(self, library, lib_type, items, seconds):
+        with self._lock:
+            self.reports[lib_type] += 1
+            self.report_seconds[lib_type] += seconds
+            self.items[lib_type] += items
+            self.items_per_second[library] = items / seconds if seconds else 0.0
+
+    def render(self):
+        def labels(**values):
+            return '{' + ','.join(f'{k}="{str(v).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+                                  for k, v in values.items()) + '}'
+
+        lines = []
+        with self._lock:
+            lines += ['# HELP plex_reporter_phase_seconds_total Time spent in each report phase.',
+                      '# TYPE plex_reporter_phase_seconds_total counter']
+            lines += [f'plex_reporter_phase_seconds_total{labels(phase=phase)} {seconds:.6f}'
+                      for phase, seconds in sorted(self.phase_seconds.items())]
+
+            lines += ['# HELP plex_reporter_plex_requests_total Requests sent to Plex by endpoint and status.',
+                      '# TYPE plex_reporter_plex_requests_total counter']
+            lines += [f'plex_reporter_plex_requests_total{labels(endpoint=endpoint, status=status)} {count}'
+                      for (endpoint, status), count in sorted(self.requests.items())]
+
+            lines += ['# HELP plex_reporter_plex_request_duration_seconds Plex request latency by endpoint.',
+                      '# TYPE plex_reporter_plex_request_duration_seconds histogram']
+            for endpoint in sorted(self.latency_count):
+                for bound, count in zip(LATENCY_BUCKETS, self.latency_buckets[endpoint]):
+                    lines.append(f'plex_reporter_plex_request_duration_seconds_bucket{labels(endpoint=endpoint, le=bound)} {count}')
+                lines.append(f'plex_reporter_plex_request_duration_seconds_bucket{labels(endpoint=endpoint, le="+Inf")} '
+                             f'{self.latency_count[endpoint]}')
+                lines.append(f'plex_reporter_plex_request_duration_seconds_sum{labels(endpoint=endpoint)} '
+                             f'{self.latency_sum[endpoint]:.6f}')
+                lines.append(f'plex_reporter_plex_request_duration_seconds_count{labels(endpoint=endpoint)} '
+                             f'{self.latency_count[endpoint]}')
+
+            lines += ['# HELP plex_reporter_reports_total Reports generated by library type.',
+                      '# TYPE plex_reporter_reports_total counter']
+            lines += [f'plex_reporter_reports_total{labels(type=t)} {n}' for t, n in sorted(self.reports.items())]
+            lines += ['# HELP plex_reporter_report_seconds_total Wall time spent generating reports.',
+                      '# TYPE plex_reporter_report_seconds_total counter']
+            lines += [f'plex_reporter_report_seconds_total{labels(type=t)} {n:.6f}' for t, n in sorted(self.report_seconds.items())]
+            lines += ['# HELP plex_reporter_items_total Report rows produced by library type.',
+                      '# TYPE plex_reporter_items_total counter']
+            lines += [f'plex_reporter_items_total{labels(type=t)} {n}' for t, n in sorted(self.items.items())]
+            lines += ['# HELP plex_reporter_items_per_second Throughput of the last report for each library.',
+                      '# TYPE plex_reporter_items_per_second gauge']
+            lines += [f'plex_reporter_items_per_second{labels(library=lib)} {n:.3f}'
+                      for lib, n in sorted(self.items_per_second.items())]
+        return '\n'.join(lines) + '\n'
+
+METRICS = Metrics()
+
+class ReportStats:
+    """Per-phase timings and Plex request counts for one library's report.
+
+    Phases nest: entering a phase pauses the one around it, so each second
+    is charged to exactly one phase. Everything is also added to METRICS.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = Counter()
+        self.requests = Counter()
+        self.request_seconds = Counter()
+        self._stack = []
+        self._mark = self.started
+        self._lock = threading.Lock()
+
+    def _charge(self, now):
+        if self._stack:
+            elapsed = now - self._mark
+            self.phases[self._stack[-1]] += elapsed
+            METRICS.observe_phase(self._stack[-1], elapsed)
+        self._mark = now
+
+    @contextmanager
+    def phase(self, name):
+        self._charge(time.perf_counter())
+        self._stack.append(name)
+        try:
+            yield
+        finally:
+            self._charge(time.perf_counter())
+            self._stack.pop()
+
+    def observe_request(self, endpoint, seconds):
+        with self._lock:
+            self.requests[endpoint] += 1
+            self.request_seconds[endpoint] += seconds
+
+    def summary(self, library, lib_type, items):
+        """Summary for the /api/generate result - also records the report in METRICS"""
+        seconds = time.perf_counter() - self.started
+        METRICS.observe_report(library, lib_type, items, seconds)
+        with self._lock:
+            return {
+                'seconds': round(seconds, 3),
+                'items': items,
+                'itemsPerSecond': round(items / seconds, 1) if seconds else None,
+                'phases': {phase: round(value, 3) for phase, value in self.phases.items()},
+                'plexRequests': dict(self.requests),
+                'plexRequestSeconds': {endpoint: round(value, 3) for endpoint, value in self.request_seconds.items()}
+            }
+
+_current_stats = contextvars.ContextVar('report_stats', default=None)
+
+@contextmanager
+def collect_stats():
+    """Collect a ReportStats for everything run inside the block (including fetcher threads)"""
+    stats = ReportStats()
+    token = _current_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _current_stats.reset(token)
+
+def phase(name):
+    """Time a block as one report phase (no-op outside collect_stats())"""
+    stats = _current_stats.get()
+    return stats.phase(name) if stats is not None else nullcontext()
+
+def timed(iterable, name):
+    """Iterate, charging the time spent producing each item to a phase"""
+    iterator = iter(iterable)
+    while True:
+        with phase(name):
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+        yield item
+
+def record_request(url, status, seconds):
+    """Count one Plex request under its endpoint (numeric path segments collapsed)"""
+    path = urlsplit(url).path
+    endpoint = '/'.join('{id}' if segment.isdigit() else segment for segment in path.split('/')) or '/'
+    METRICS.observe_request(endpoint, status, seconds)
+    stats = _current_stats.get()
+    if stats is not None:
+        stats.observe_request(endpoint, seconds)
+
+# Rows held in memory while sorting a report before sorted runs spill to temp files
+SORT_BUFFER_ROWS = int(os.environ.get('SORT_BUFFER_ROWS', '50000'))
+
+class ExternalSorter:
+    """Stable sort of (key, row) pairs that never holds more than `buffer_rows` in memory.
+
+    Rows collect in a buffer; whenever it fills up it is sorted and spilled to
+    a temp file as one run. Iterating merges the runs and whatever is left in
+    the buffer with heapq.merge, which keeps equal keys in insertion order, so
+    the output is exactly what list.sort() would have produced.
+    """
+
+    def __init__(self, buffer_rows=None):
+        self.buffer_rows = max(1, buffer_rows or SORT_BUFFER_ROWS)
+        self.count = 0
+        self._buffer = []
+        self._runs = []
+
+    def add(self, key, row):
+        self._buffer.append((key, row))
+        self.count += 1
+        if len(self._buffer) >= self.buffer_rows:
+            self._spill()
+
+    def _spill(self):
+        with phase('sort'):
+            self._buffer.sort(key=itemgetter(0))
+            run = tempfile.TemporaryFile(prefix='plex-report-sort-')
+            for item in self._buffer:
+                pickle.dump(item, run, protocol=pickle.HIGHEST_PROTOCOL)
+            run.seek(0)
+            self._runs.append(run)
+            self._buffer = []
+
+    @staticmethod
+    def _read_run(run):
+        while True:
+            try:
+                yield pickle.load(run)
+            except EOFError:
+                return
+
+    def __iter__(self):
+        with phase('sort'):
+            self._buffer.sort(key=itemgetter(0))
+        runs = [self._read_run(run) for run in self._runs] + [iter(self._buffer)]
+        for _, row in timed(heapq.merge(*runs, key=itemgetter(0)), 'sort'):
+            yield row
+
+    def close(self):
+        for run in self._runs:
+            run.close()
+        self._runs = []
+        self._buffer = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
 
 def format_file_size(size_bytes):
     if size_bytes is None:
@@ -72,6 +570,1228 @@ def format_file_size(size_bytes):
         size_bytes/=1024.0
     return f"{size_bytes:.2f} PB"
 
+def text_cell(title):
+    """Prepend a tab to numeric-only titles so spreadsheets keep them as text"""
+    if title.strip().replace('-','').replace('.','').isdigit():
+        return '\t' + title
+    return title
+
+def format_datetime(value, missing):
+    return value.strftime('%Y-%m-%d %H:%M:%S') if value else missing
+
+MOVIE_CSV_HEADER = ['Title','Year','Date Added','Play Count','Last Watched','Status','File Path','File Size']
+TV_CSV_HEADER = ['Show Title','Season Number','Watched Status','Total Episodes','Episodes Watched','Last Watched','Status','Date Added','Total Size']
+
+def format_movie_row(row):
+    """Typed movie row -> CSV cells"""
+    title, year, added_at, play_count, last_watched, status, file_path, file_size = row[:8]
+    return (text_cell(title), year, format_datetime(added_at, 'Unknown'), play_count,
+            format_datetime(last_watched, 'Never'), status, file_path, format_file_size(file_size))
+
+def format_tv_row(row):
+    """Typed TV season row -> CSV cells"""
+    show_title, season_number, watched_status, total_episodes, watched_episodes, last_watched, status, added_at, size = row[:9]
+    return (text_cell(show_title), f"Season {season_number}", watched_status, total_episodes, watched_episodes,
+            format_datetime(last_watched, 'Never'), status, format_datetime(added_at, 'Unknown'), format_file_size(size))
+
+# Number of history entries requested per page from /status/sessions/history/all
+HISTORY_PAGE_SIZE = 1000
+# Number of downloaded history entries written to the local store per transaction
+HISTORY_BATCH_ROWS = 5000
+# Number of items requested per page from a library section listing
+LISTING_PAGE_SIZE = 500
+
+def iter_section_items(section, libtype, page_size=LISTING_PAGE_SIZE, fetcher=None, progress_data=None):
+    """Yield every item of one type in a section (e.g. all episodes), page by page.
+
+    Pages are requested with container_start/container_size, concurrently when
+    a fetcher is given; items always come back in listing order. Only a few
+    pages are held in memory at once. If progress_data is given, its
+    total_items is set to the number of items in the listing.
+    """
+    total = section.totalViewSize(libtype=libtype, includeCollections=False) or 0
+    if progress_data is not None:
+        progress_data['total_items'] = total
+
+    def fetch_page(start):
+        check_cancelled()
+        return section.search(libtype=libtype, container_start=start,
+                              container_size=page_size, maxresults=page_size)
+
+    for page in fetch_map(fetcher, fetch_page, range(0, total, page_size)):
+        check_cancelled()
+        yield from page
+
+def iter_updated_episodes(section, since, page_size=LISTING_PAGE_SIZE):
+    """Yield raw attributes of the section's episodes with updatedAt >= `since` (epoch seconds).
+
+    Read straight from the listing XML without building plexapi objects - only
+    parentRatingKey and updatedAt are needed to tell which seasons changed.
+    """
+    path = f"/library/sections/{section.key}/all?type={plex_utils.searchType('episode')}&updatedAt>={int(since)}"
+    start = 0
+    while True:
+        check_cancelled()
+        data = section._server.query(path, headers={
+            'X-Plex-Container-Start': str(start),
+            'X-Plex-Container-Size': str(page_size)
+        })
+        if data is None:
+            return
+        page = list(data)
+        yield from (elem.attrib for elem in page)
+        start += len(page)
+        total_size = int(data.attrib.get('totalSize', 0) or 0)
+        if len(page) < page_size or (total_size and start >= total_size):
+            return
+
+class HistoryIndex:
+    """In-memory watch history for one library, keyed by ratingKey.
+
+    Every play is counted against the item itself (movie/episode), its parent
+    (season) and its grandparent (show), so any level can be looked up without
+    another request to Plex. It holds one entry per watched item, season and
+    show, so it grows with the watched history rather than the library size.
+    """
+
+    def __init__(self):
+        # ratingKey -> [play_count, last viewedAt timestamp]
+        self.entries = {}
+
+    def add(self, viewed_at, *rating_keys):
+        for key in rating_keys:
+            if not key:
+                continue
+            entry = self.entries.get(key)
+            if entry is None:
+                self.entries[key] = [1, viewed_at]
+            else:
+                entry[0] += 1
+                if viewed_at > entry[1]:
+                    entry[1] = viewed_at
+
+    def play_count(self, rating_key):
+        entry = self.entries.get(str(rating_key))
+        return entry[0] if entry else 0
+
+    def last_viewed(self, rating_key):
+        """Most recent watch date across all users, or None if never watched"""
+        entry = self.entries.get(str(rating_key))
+        if not entry or not entry[1]:
+            return None
+        return plex_utils.toDatetime(entry[1])
+
+def iter_section_history(plex, section_key, since=None, page_size=HISTORY_PAGE_SIZE, counter=None, fetcher=None):
+    """Yield raw history entries (XML attributes) for one library section, oldest first.
+
+    Entries are paged with X-Plex-Container-Start/Size. If `since` is given
+    (a viewedAt timestamp), only entries from that point on are requested.
+    With a `fetcher`, the pages after the first are downloaded concurrently.
+    """
+    path = f'/status/sessions/history/all?sort=viewedAt:asc&librarySectionID={section_key}'
+    if since:
+        path += f'&viewedAt>={int(since)}'
+
+    def fetch_page(start):
+        check_cancelled()
+        return plex.query(path, headers={
+            'X-Plex-Container-Start': str(start),
+            'X-Plex-Container-Size': str(page_size)
+        })
+
+    def count_request():
+        if counter is not None:
+            counter['requests'] = counter.get('requests', 0) + 1
+
+    data = fetch_page(0)
+    count_request()
+    if data is None:
+        return
+    page = list(data)
+    yield from (entry.attrib for entry in page)
+
+    total_size = int(data.attrib.get('totalSize', 0) or 0)
+    if fetcher is not None and total_size:
+        # Page count is known up front - fetch the rest in parallel, yield in order
+        for data in fetcher.map(fetch_page, range(page_size, total_size, page_size)):
+            count_request()
+            if data is not None:
+                yield from (entry.attrib for entry in data)
+        return
+
+    start = len(page)
+    while len(page) == page_size and not (total_size and start >= total_size):
+        data = fetch_page(start)
+        count_request()
+        if data is None:
+            return
+        page = list(data)
+        yield from (entry.attrib for entry in page)
+        start += len(page)
+
+def count_section_history(plex, section_key):
+    """Total number of history entries Plex holds for a section (one tiny request)"""
+    data = plex.query(f'/status/sessions/history/all?librarySectionID={section_key}', headers={
+        'X-Plex-Container-Start': '0',
+        'X-Plex-Container-Size': '0'
+    })
+    if data is None:
+        return 0
+    return int(data.attrib.get('totalSize', 0) or 0)
+
+@contextmanager
+def sqlite_connect(path):
+    """SQLite connection in WAL mode that commits on success and is always closed"""
+    db = sqlite3.connect(path, timeout=30)
+    try:
+        db.execute('PRAGMA journal_mode=WAL')
+        with db:
+            yield db
+    finally:
+        db.close()
+
+class HistoryStore:
+    """Local SQLite copy of Plex watch history per server and section, synced incrementally"""
+
+    def __init__(self, path=HISTORY_DB_FILE):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with self._connect() as db:
+            db.executescript("""
+                CREATE TABLE IF NOT EXISTS history (
+                    server_id TEXT NOT NULL,
+                    section_id TEXT NOT NULL,
+                    history_key TEXT NOT NULL,
+                    rating_key TEXT,
+                    parent_rating_key TEXT,
+                    grandparent_rating_key TEXT,
+                    account_id TEXT,
+                    viewed_at INTEGER NOT NULL,
+                    PRIMARY KEY (server_id, section_id, history_key)
+                );
+                CREATE TABLE IF NOT EXISTS sync_state (
+                    server_id TEXT NOT NULL,
+                    section_id TEXT NOT NULL,
+                    high_water INTEGER NOT NULL DEFAULT 0,
+                    synced_at TEXT,
+                    PRIMARY KEY (server_id, section_id)
+                );
+            """)
+
+    def _connect(self):
+        return sqlite_connect(self.path)
+
+    def clear(self, server_id, section_id):
+        with self._connect() as db:
+            db.execute('DELETE FROM history WHERE server_id=? AND section_id=?', (server_id, section_id))
+            db.execute('DELETE FROM sync_state WHERE server_id=? AND section_id=?', (server_id, section_id))
+
+    def sync(self, plex, section_key, full=False, fetcher=None):
+        """Bring the local copy of one section's history up to date with Plex"""
+        server_id = plex.machineIdentifier or PLEX_URL
+        section_id = str(section_key)
+        counter = {}
+
+        check_cancelled()
+        if full:
+            self.clear(server_id, section_id)
+        added = self._pull(plex, server_id, section_id, counter, fetcher)
+
+        # Cheap consistency check - if counts disagree, catch up once more (a play may
+        # have landed mid-sync) and if they still disagree, start over for this section
+        if not full and not self._matches_server(plex, server_id, section_id, counter):
+            added += self._pull(plex, server_id, section_id, counter, fetcher)
+            if not self._matches_server(plex, server_id, section_id, counter):
+                self.clear(server_id, section_id)
+                added = self._pull(plex, server_id, section_id, counter, fetcher)
+                full = True
+
+        return {'added': added, 'fullResync': full, 'requests': counter['requests']}
+
+    def high_water(self, server_id, section_id):
+        """Newest viewedAt synced for a section (0 if never synced)"""
+        with self._connect() as db:
+            row = db.execute('SELECT high_water FROM sync_state WHERE server_id=? AND section_id=?',
+                             (server_id, str(section_id))).fetchone()
+        return row[0] if row else 0
+
+    def _pull(self, plex, server_id, section_id, counter, fetcher=None):
+        high_water = self.high_water(server_id, section_id)
+
+        added = 0
+        rows = []
+        for entry in iter_section_history(plex, section_id, since=high_water or None, counter=counter, fetcher=fetcher):
+            viewed_at = int(entry.get('viewedAt') or 0)
+            history_key = entry.get('historyKey') or f"{entry.get('ratingKey')}:{entry.get('accountID')}:{viewed_at}"
+            rows.append((server_id, section_id, history_key, entry.get('ratingKey'),
+                         entry.get('parentRatingKey'), entry.get('grandparentRatingKey'),
+                         entry.get('accountID'), viewed_at))
+            high_water = max(high_water, viewed_at)
+            if len(rows) >= HISTORY_BATCH_ROWS:
+                added += self._insert(rows)
+                rows = []
+        added += self._insert(rows)
+
+        # Rows already written are de-duplicated next time, but the high-water mark
+        # only moves once the whole download is in and the job wasn't cancelled
+        check_cancelled()
+        with self._connect() as db:
+            db.execute('INSERT OR REPLACE INTO sync_state VALUES (?,?,?,?)',
+                       (server_id, section_id, high_water, datetime.now().isoformat(timespec='seconds')))
+        return added
+
+    def _insert(self, rows):
+        """Write a batch of history rows, returning how many were new"""
+        if not rows:
+            return 0
+        with self._connect() as db:
+            before = db.total_changes
+            db.executemany('INSERT OR IGNORE INTO history VALUES (?,?,?,?,?,?,?,?)', rows)
+            return db.total_changes - before
+
+    def _matches_server(self, plex, server_id, section_id, counter):
+        counter['requests'] = counter.get('requests', 0) + 1
+        return count_section_history(plex, section_id) == self.count(server_id, section_id)
+
+    def count(self, server_id, section_id):
+        with self._connect() as db:
+            return db.execute('SELECT COUNT(*) FROM history WHERE server_id=? AND section_id=?',
+                              (server_id, section_id)).fetchone()[0]
+
+    def load_index(self, server_id, section_id):
+        """Build a HistoryIndex for one section from the local copy"""
+        index = HistoryIndex()
+        with self._connect() as db:
+            for column in ('rating_key', 'parent_rating_key', 'grandparent_rating_key'):
+                for key, plays, last_viewed in db.execute(
+                        f'SELECT {column}, COUNT(*), MAX(viewed_at) FROM history '
+                        f'WHERE server_id=? AND section_id=? AND {column} IS NOT NULL AND {column}!=\'\' '
+                        f'GROUP BY {column}', (server_id, str(section_id))):
+                    index.entries[key] = [plays, last_viewed]
+        return index
+
+def load_section_history(section, full_resync=False, fetcher=None):
+    """Sync the local history store for a section and return its HistoryIndex"""
+    plex = section._server
+    store = HistoryStore(HISTORY_DB_FILE)
+    store.sync(plex, section.key, full=full_resync, fetcher=fetcher)
+    return store.load_index(plex.machineIdentifier or PLEX_URL, section.key)
+
+def media_size(item):
+    """Total bytes of every media part of an item, read from its listing XML"""
+    return sum(int(part.get('size') or 0) for part in item._data.iter('Part'))
+
+def item_fingerprint(item, part=False):
+    """Change fingerprint of a listed item, read straight from its listing XML.
+
+    Covers updatedAt/addedAt/leafCount and, with part=True, the first media
+    part's file and size - without building plexapi's Media objects.
+    """
+    data = item._data
+    values = [data.get('updatedAt'), data.get('addedAt'), data.get('leafCount')]
+    if part:
+        elem = data.find('Media/Part')
+        values += [elem.get('file'), elem.get('size')] if elem is not None else [None, None]
+    return ':'.join(value or '' for value in values)
+
+# A snapshot keeps the newest updatedAt it saw as a watermark, and the next run asks Plex for
+# episodes updated since then, so a season whose episodes were replaced is rebuilt even though
+# the season itself looks unchanged. This many seconds are taken off the watermark, so an item
+# whose updatedAt was stamped before a long scan committed it is still seen
+UPDATED_SLACK = 3600
+
+class SnapshotStore:
+    """SQLite store of the rows behind each library's last report, for incremental re-runs"""
+
+    def __init__(self, path=None):
+        self.path = path or SNAPSHOT_DB_FILE
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with self._connect() as db:
+            db.executescript("""
+                CREATE TABLE IF NOT EXISTS snapshot_items (
+                    server_id TEXT NOT NULL,
+                    section_id TEXT NOT NULL,
+                    generation TEXT NOT NULL,
+                    rating_key TEXT NOT NULL,
+                    fingerprint TEXT NOT NULL,
+                    data TEXT,
+                    label TEXT,
+                    status TEXT,
+                    PRIMARY KEY (server_id, section_id, generation, rating_key)
+                );
+                CREATE TABLE IF NOT EXISTS snapshot_state (
+                    server_id TEXT NOT NULL,
+                    section_id TEXT NOT NULL,
+                    kind TEXT NOT NULL,
+                    generation TEXT NOT NULL,
+                    watermark INTEGER NOT NULL DEFAULT 0,
+                    generated_at TEXT,
+                    PRIMARY KEY (server_id, section_id)
+                );
+            """)
+
+    def _connect(self):
+        return sqlite_connect(self.path)
+
+    def open(self, section, kind, rebuild=False):
+        """Snapshot for a new run over `section` - rebuild=True recomputes every row"""
+        server_id = section._server.machineIdentifier or PLEX_URL
+        section_id = str(section.key)
+        with self._connect() as db:
+            state = db.execute('SELECT generation, watermark, generated_at FROM snapshot_state '
+                               'WHERE server_id=? AND section_id=? AND kind=?',
+                               (server_id, section_id, kind)).fetchone()
+        return ReportSnapshot(self, server_id, section_id, kind, state, reuse=not rebuild)
+
+class ReportSnapshot:
+    """One library's snapshot while its report is generated - reused and recorded rows, then saved"""
+
+    FLUSH_ROWS = 1000
+
+    def __init__(self, store, server_id, section_id, kind, state=None, reuse=True):
+        self.store = store
+        self.server_id = server_id
+        self.section_id = section_id
+        self.kind = kind
+        self.has_previous = state is not None
+        self.previous_generation = state[0] if state else None
+        self.previous_watermark = state[1] if state else 0
+        self.previous_run = state[2] if state else None
+        self.reuse_enabled = reuse and self.has_previous
+        self.generation = uuid.uuid4().hex
+        self.watermark = self.previous_watermark
+        self.stats = Counter()
+        self._pending = []
+        self._lock = threading.Lock()
+        self._db = None
+
+    def _reader(self):
+        # Caller holds the lock - one connection for every lookup of the run
+        if self._db is None:
+            self._db = sqlite3.connect(self.store.path, timeout=30, check_same_thread=False)
+        return self._db
+
+    def _close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def reuse(self, rating_key, fingerprint, stale=False):
+        """Stored data for an unchanged item, or None if it is new, changed or stale (counted as revalidated)"""
+        if not self.reuse_enabled:
+            return None
+        with self._lock:
+            row = self._reader().execute(
+                'SELECT fingerprint, data FROM snapshot_items '
+                'WHERE server_id=? AND section_id=? AND generation=? AND rating_key=?',
+                (self.server_id, self.section_id, self.previous_generation, str(rating_key))).fetchone()
+            if row is None or row[0] != fingerprint:
+                return None
+            if stale:
+                self.stats['revalidated'] += 1
+                return None
+        return json.loads(row[1])
+
+    def observe(self, updated_at):
+        """Move the watermark up to an updatedAt (epoch seconds) seen in this run"""
+        if updated_at:
+            with self._lock:
+                self.watermark = max(self.watermark, int(updated_at))
+
+    def record(self, rating_key, fingerprint, data, label, status, reused=False):
+        with self._lock:
+            if reused:
+                self.stats['reused'] += 1
+            self._pending.append((self.server_id, self.section_id, self.generation, str(rating_key),
+                                  fingerprint, json.dumps(data), label, status))
+            if len(self._pending) >= self.FLUSH_ROWS:
+                self._flush()
+
+    def _flush(self):
+        if not self._pending:
+            return
+        with self.store._connect() as db:
+            db.executemany('INSERT OR REPLACE INTO snapshot_items (server_id, section_id, generation, rating_key, '
+                           'fingerprint, data, label, status) VALUES (?,?,?,?,?,?,?,?)', self._pending)
+        self._pending = []
+
+    def changes(self):
+        """Yield (label, previous status, status) per changed, new or removed row - call before save()"""
+        if not self.has_previous:
+            return
+        with self._lock:
+            self._flush()
+        with self.store._connect() as db:
+            db.create_function('sort_label', 1, lambda label: (label or '').strip().lower(), deterministic=True)
+            yield from db.execute("""
+                SELECT label, previous, status FROM (
+                    SELECT cur.label AS label, COALESCE(prev.status, 'New') AS previous, cur.status AS status,
+                           cur.rating_key AS rating_key
+                    FROM snapshot_items AS cur LEFT JOIN snapshot_items AS prev
+                        ON prev.server_id=cur.server_id AND prev.section_id=cur.section_id
+                        AND prev.generation=:previous AND prev.rating_key=cur.rating_key
+                    WHERE cur.server_id=:server AND cur.section_id=:section AND cur.generation=:current
+                        AND (prev.rating_key IS NULL OR prev.status IS NOT cur.status)
+                    UNION ALL
+                    SELECT prev.label, prev.status, 'Removed', prev.rating_key
+                    FROM snapshot_items AS prev
+                    WHERE prev.server_id=:server AND prev.section_id=:section AND prev.generation=:previous
+                        AND NOT EXISTS (SELECT 1 FROM snapshot_items AS cur
+                                        WHERE cur.server_id=prev.server_id AND cur.section_id=prev.section_id
+                                        AND cur.generation=:current AND cur.rating_key=prev.rating_key)
+                ) ORDER BY sort_label(label), label, rating_key
+            """, self._generations())
+
+    def _generations(self):
+        return {'server': self.server_id, 'section': self.section_id, 'current': self.generation,
+                'previous': self.previous_generation}
+
+    def save(self):
+        """Make this run the snapshot the next run compares against"""
+        with self._lock:
+            self._flush()
+            with self.store._connect() as db:
+                params = self._generations()
+                rows, added, status_changed = db.execute("""
+                    SELECT COUNT(*), COALESCE(SUM(prev.rating_key IS NULL), 0),
+                           COALESCE(SUM(prev.rating_key IS NOT NULL AND prev.status IS NOT cur.status), 0)
+                    FROM snapshot_items AS cur LEFT JOIN snapshot_items AS prev
+                        ON prev.server_id=cur.server_id AND prev.section_id=cur.section_id
+                        AND prev.generation=:previous AND prev.rating_key=cur.rating_key
+                    WHERE cur.server_id=:server AND cur.section_id=:section AND cur.generation=:current
+                """, params).fetchone()
+                # Anything the last run had that was not seen this time is gone from the report
+                removed = db.execute("""
+                    SELECT COUNT(*) FROM snapshot_items AS prev
+                    WHERE prev.server_id=:server AND prev.section_id=:section AND prev.generation=:previous
+                        AND NOT EXISTS (SELECT 1 FROM snapshot_items AS cur
+                                        WHERE cur.server_id=prev.server_id AND cur.section_id=prev.section_id
+                                        AND cur.generation=:current AND cur.rating_key=prev.rating_key)
+                """, params).fetchone()[0]
+                self.stats.update(added=added, changed=rows - added - self.stats['reused'], removed=removed,
+                                  statusChanges=added + status_changed + removed if self.has_previous else 0)
+                db.execute('DELETE FROM snapshot_items WHERE server_id=? AND section_id=? AND generation!=?',
+                           (self.server_id, self.section_id, self.generation))
+                db.execute('INSERT OR REPLACE INTO snapshot_state (server_id, section_id, kind, generation, '
+                           'watermark, generated_at) VALUES (?,?,?,?,?,?)',
+                           (self.server_id, self.section_id, self.kind, self.generation, self.watermark,
+                            datetime.now().isoformat(timespec='seconds')))
+            self._close()
+
+    def discard(self):
+        """Drop a run that did not finish - the previous snapshot stays current"""
+        with self._lock:
+            self._pending = []
+            self._close()
+        with self.store._connect() as db:
+            db.execute('DELETE FROM snapshot_items WHERE server_id=? AND section_id=? AND generation=?',
+                       (self.server_id, self.section_id, self.generation))
+
+    def summary(self):
+        return {
+            'reused': self.stats['reused'],
+            'changed': self.stats['changed'],
+            'added': self.stats['added'],
+            'removed': self.stats['removed'],
+            'revalidated': self.stats['revalidated'],
+            'statusChanges': self.stats['statusChanges'],
+            'previousRun': self.previous_run
+        }
+
+def write_changes_report(snapshot, output_path):
+    """CSV of the rows whose status changed since the previous run"""
+    count = 0
+    with phase('csv_write'), open(output_path,'w',newline='',encoding='utf-8') as csvfile:
+        writer=csv.writer(csvfile)
+        writer.writerow(['Item','Previous Status','Status'])
+        for change in snapshot.changes():
+            writer.writerow(change)
+            count += 1
+    return count
+
+# Typed columns of each report kind - the CSV columns in order, then extras
+# (totalSize = every media part of the movie / every episode of the season)
+REPORT_COLUMNS = {
+    'movie': (('title', str), ('year', int), ('addedAt', datetime), ('playCount', int),
+              ('lastWatched', datetime), ('status', str), ('filePath', str), ('fileSize', int),
+              ('totalSize', int)),
+    'tv': (('showTitle', str), ('season', int), ('watchedStatus', str), ('totalEpisodes', int),
+           ('episodesWatched', int), ('lastWatched', datetime), ('status', str), ('addedAt', datetime),
+           ('totalSize', int), ('year', int))
+}
+# Columns with a precomputed index - value lists for status, sorted order for the rest
+INDEXED_COLUMNS = ('status', 'playCount', 'episodesWatched', 'lastWatched', 'fileSize', 'totalSize')
+# Stand-in for missing ints and dates ("Never", "Unknown") - the smallest value, so it sorts first ascending
+NULL = -2 ** 63
+QUERY_PAGE_SIZE = 100
+MAX_QUERY_PAGE_SIZE = 1000
+
+class ReportTable:
+    """Typed, column-oriented copy of one report's rows, in report order.
+
+    Ints and datetimes (as epoch seconds) live in array('q') columns, strings
+    in lists. Once finished, status has a value -> rows index and the
+    numeric/date columns a sorted-order index, so filters and single-column
+    sorts don't have to scan or re-sort the whole report. Query results are
+    cached so cursor pages don't redo the work.
+    """
+
+    def __init__(self, kind, library=''):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.library = library
+        self.created_at = datetime.now()
+        self.columns = REPORT_COLUMNS[kind]
+        self.types = dict(self.columns)
+        self.data = {name: [] if col_type is str else array('q') for name, col_type in self.columns}
+        self.value_index = {}
+        self.sorted_index = {}
+        self._results = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.data[self.columns[0][0]])
+
+    def append(self, row):
+        for (name, col_type), value in zip(self.columns, row):
+            if col_type is str:
+                value = '' if value is None else str(value)
+            elif col_type is datetime:
+                value = int(value.timestamp()) if value else NULL
+            elif not isinstance(value, int):
+                value = NULL
+            self.data[name].append(value)
+
+    def collect(self, rows):
+        """Pass rows through, appending each one on the way"""
+        for row in rows:
+            self.append(row)
+            yield row
+
+    def finish(self):
+        """Build the indexes once all rows are in"""
+        for name in INDEXED_COLUMNS:
+            if name not in self.types:
+                continue
+            column = self.data[name]
+            if self.types[name] is str:
+                index = defaultdict(lambda: array('q'))
+                for row_id, value in enumerate(column):
+                    index[value].append(row_id)
+                self.value_index[name] = dict(index)
+            else:
+                order = array('q', sorted(range(len(column)), key=column.__getitem__))
+                self.sorted_index[name] = (order, array('q', (column[row_id] for row_id in order)))
+        return self
+
+    def value(self, name, row_id, tz=None):
+        """JSON-ready value - dates as ISO strings, local time unless a tz is given"""
+        value = self.data[name][row_id]
+        if self.types[name] is datetime:
+            return datetime.fromtimestamp(value, tz).isoformat() if value != NULL else None
+        if self.types[name] is int and value == NULL:
+            return None
+        return value
+
+    def row(self, row_id, tz=None):
+        return {name: self.value(name, row_id, tz) for name, _ in self.columns}
+
+    def parse_value(self, name, text):
+        """Query string value -> stored column value"""
+        col_type = self.types[name]
+        if col_type is str:
+            return text
+        if col_type is datetime:
+            if text.lstrip('-').isdigit():
+                return int(text)
+            return int(datetime.fromisoformat(text).timestamp())
+        return int(float(text))
+
+    def summary(self):
+        return {
+            'reportId': self.id,
+            'library': self.library,
+            'kind': self.kind,
+            'rowCount': len(self),
+            'createdAt': self.created_at.isoformat(timespec='seconds'),
+            'columns': [{'name': name, 'type': col_type.__name__} for name, col_type in self.columns],
+            'indexes': sorted(self.value_index) + sorted(self.sorted_index),
+            'statusCounts': {status: len(rows) for status, rows in self.value_index.get('status', {}).items()}
+        }
+
+    def select(self, equals=(), ranges=(), search=None):
+        """Row IDs matching every filter, in report order.
+
+        equals: (column, [values]) pairs - a row matches any of the values.
+        ranges: (column, low, high) triples, inclusive, either end may be None.
+        search: case-insensitive substring of any text column.
+        """
+        matched = None
+
+        def narrow(row_ids):
+            nonlocal matched
+            matched = set(row_ids) if matched is None else matched.intersection(row_ids)
+
+        for name, values in equals:
+            if name in self.value_index:
+                index = self.value_index[name]
+                narrow(row_id for value in values for row_id in index.get(value, ()))
+            else:
+                wanted = set(values)
+                narrow(row_id for row_id, value in enumerate(self.data[name]) if value in wanted)
+        for name, low, high in ranges:
+            if name in self.sorted_index:
+                order, values = self.sorted_index[name]
+                start = bisect.bisect_left(values, low) if low is not None else 0
+                stop = bisect.bisect_right(values, high) if high is not None else len(values)
+                # Missing values never match a range
+                start = max(start, bisect.bisect_right(values, NULL))
+                narrow(order[start:stop])
+            else:
+                narrow(row_id for row_id, value in enumerate(self.data[name])
+                       if value != NULL and (low is None or value >= low) and (high is None or value <= high))
+        if search:
+            needle = search.casefold()
+            text_columns = [self.data[name] for name, col_type in self.columns if col_type is str]
+            narrow(row_id for row_id in range(len(self))
+                   if any(needle in column[row_id].casefold() for column in text_columns))
+
+        if matched is None:
+            return array('q', range(len(self)))
+        return array('q', sorted(matched))
+
+    def order(self, row_ids, sort):
+        """Sort row IDs by (column, descending) keys - missing values sort first ascending, last descending"""
+        if not sort:
+            return row_ids
+        if len(sort) == 1 and sort[0][0] in self.sorted_index:
+            # Walk the precomputed order instead of sorting
+            name, descending = sort[0]
+            order, values = self.sorted_index[name]
+            if descending:
+                # Step back through runs of equal values, keeping report order within each run
+                runs = []
+                end = len(order)
+                while end > 0:
+                    start = bisect.bisect_left(values, values[end - 1], 0, end)
+                    runs.append(order[start:end])
+                    end = start
+                order = array('q', (row_id for run in runs for row_id in run))
+            if len(row_ids) == len(self):
+                return array('q', order)
+            wanted = bytearray(len(self))
+            for row_id in row_ids:
+                wanted[row_id] = 1
+            return array('q', (row_id for row_id in order if wanted[row_id]))
+        # Stable multi-key sort: apply keys from last to first
+        ordered = list(row_ids)
+        for name, descending in reversed(sort):
+            column = self.data[name]
+            key = (lambda row_id: column[row_id].casefold()) if self.types[name] is str else column.__getitem__
+            ordered.sort(key=key, reverse=descending)
+        return array('q', ordered)
+
+    def query(self, equals=(), ranges=(), search=None, sort=()):
+        """Ordered row IDs for a query, plus a short token identifying the query"""
+        spec = json.dumps([sorted(equals), sorted(ranges, key=lambda r: r[0]), search, sort], default=str)
+        token = hashlib.sha1(spec.encode()).hexdigest()[:12]
+        with self._lock:
+            if token in self._results:
+                self._results.move_to_end(token)
+                return self._results[token], token
+        result = self.order(self.select(equals, ranges, search), sort)
+        with self._lock:
+            self._results[token] = result
+            while len(self._results) > 8:
+                self._results.popitem(last=False)
+        return result, token
+
+class ReportStore:
+    """The most recently generated report tables, by report ID"""
+
+    def __init__(self, limit=REPORT_STORE_LIMIT):
+        self.limit = limit
+        self._tables = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, table):
+        with self._lock:
+            self._tables[table.id] = table
+            while len(self._tables) > self.limit:
+                self._tables.popitem(last=False)
+
+    def get(self, report_id):
+        with self._lock:
+            return self._tables.get(report_id)
+
+    def list(self):
+        with self._lock:
+            return list(self._tables.values())
+
+    def clear(self):
+        with self._lock:
+            self._tables.clear()
+
+report_store = ReportStore()
+
+def encode_cursor(token, offset):
+    return base64.urlsafe_b64encode(f'{token}:{offset}'.encode()).decode().rstrip('=')
+
+def decode_cursor(cursor, token):
+    """Offset stored in a cursor - raises ValueError if it belongs to a different query"""
+    try:
+        cursor_token, offset = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode().split(':')
+        offset = int(offset)
+    except Exception:
+        raise ValueError('Invalid cursor') from None
+    if cursor_token != token or offset < 0:
+        raise ValueError('Cursor does not belong to this query')
+    return offset
+
+# Statuses whose files are candidates for deletion
+RECLAIMABLE_STATUSES = ('Never Watched', 'Stale')
+# (upper bound in days since added, label) - anything older is "5+ years"
+ADDED_AGE_BUCKETS = ((180, '< 6 months'), (365, '6-12 months'), (730, '1-2 years'), (1825, '2-5 years'))
+ADDED_AGE_LABELS = [label for _, label in ADDED_AGE_BUCKETS] + ['5+ years', 'Unknown']
+
+def space_columns(tables, now):
+    """Flat int64 columns over all rows of `tables`: (status, library, year, age bucket, size) plus statuses.
+
+    Status and library become small integer codes, dates an added-age bucket.
+    Columns are numpy arrays when numpy is available, array('q') otherwise.
+    """
+    statuses = sorted({status for table in tables for status in table.value_index.get('status', {})})
+    status_codes = {status: code for code, status in enumerate(statuses)}
+    bounds = [now - days * 86400 for days, _ in ADDED_AGE_BUCKETS]
+    unknown_age = len(ADDED_AGE_BUCKETS) + 1
+
+    if np is not None:
+        status_parts, library_parts, year_parts, age_parts, size_parts = [], [], [], [], []
+        for library_code, table in enumerate(tables):
+            rows = len(table)
+            status = np.zeros(rows, dtype=np.int64)
+            for value, row_ids in table.value_index.get('status', {}).items():
+                status[np.frombuffer(row_ids, dtype=np.int64)] = status_codes[value]
+            added = np.frombuffer(table.data['addedAt'], dtype=np.int64)
+            # Newer than the first bound -> bucket 0, older than the last -> "5+ years"
+            age = np.searchsorted(-np.array(bounds, dtype=np.int64), -added, side='left')
+            age[added == NULL] = unknown_age
+            status_parts.append(status)
+            library_parts.append(np.full(rows, library_code, dtype=np.int64))
+            year_parts.append(np.frombuffer(table.data['year'], dtype=np.int64))
+            age_parts.append(age)
+            size_parts.append(np.frombuffer(table.data['totalSize'], dtype=np.int64))
+        columns = [np.concatenate(parts) if parts else np.zeros(0, dtype=np.int64)
+                   for parts in (status_parts, library_parts, year_parts, age_parts, size_parts)]
+        return columns, statuses
+
+    status, library, year, age, size = (array('q') for _ in range(5))
+    for library_code, table in enumerate(tables):
+        codes = array('q', bytes(8 * len(table)))
+        for value, row_ids in table.value_index.get('status', {}).items():
+            for row_id in row_ids:
+                codes[row_id] = status_codes[value]
+        status.extend(codes)
+        library.extend([library_code] * len(table))
+        year.extend(table.data['year'])
+        age.extend(unknown_age if added == NULL else sum(added < bound for bound in bounds)
+                   for added in table.data['addedAt'])
+        size.extend(table.data['totalSize'])
+    return [status, library, year, age, size], statuses
+
+def group_space(keys, status, size, status_count):
+    """{(key, status code): [items, bytes]} over parallel columns"""
+    if np is not None:
+        if not len(keys):
+            return {}
+        # Dense key codes first - raw keys (NULL years) would overflow when combined with status
+        values, key_codes = np.unique(keys, return_inverse=True)
+        groups, inverse = np.unique(key_codes.ravel() * status_count + status, return_inverse=True)
+        items = np.bincount(inverse.ravel())
+        # float64 weights are exact for totals below 2**53 bytes (8 PiB)
+        total = np.bincount(inverse.ravel(), weights=size)
+        return {(int(values[group // status_count]), int(group % status_count)): [int(count), int(round(bytes_))]
+                for group, count, bytes_ in zip(groups, items, total)}
+    totals = defaultdict(lambda: [0, 0])
+    for key, code, bytes_ in zip(keys, status, size):
+        entry = totals[key * status_count + code]
+        entry[0] += 1
+        entry[1] += bytes_
+    return {divmod(group, status_count): entry for group, entry in totals.items()}
+
+def summarize_space(tables, now=None):
+    """Disk space by status, library, year and added-age bucket across report tables.
+
+    The group-bys run as vectorized numpy operations over the tables' array
+    columns when numpy is installed, so they stay fast over hundreds of
+    thousands of rows.
+    """
+    now = int((now or datetime.now()).timestamp())
+    (status, library, year, age, size), statuses = space_columns(tables, now)
+    status_count = max(1, len(statuses))
+    reclaimable = {code for code, value in enumerate(statuses) if value in RECLAIMABLE_STATUSES}
+
+    def grouped(keys, field=None, label=None):
+        rows = []
+        for (key, code), (items, bytes_) in sorted(group_space(keys, status, size, status_count).items()):
+            row = {field: label(key)} if field else {}
+            row.update(status=statuses[code], items=items, bytes=bytes_, reclaimable=code in reclaimable)
+            rows.append(row)
+        return rows
+
+    # Status alone is grouped on the library column with every key collapsed to 0
+    by_status = grouped(library * 0 if np is not None else array('q', bytes(8 * len(library))))
+    return {
+        'reports': [table.id for table in tables],
+        'libraries': [table.library for table in tables],
+        'engine': 'numpy' if np is not None else 'python',
+        'totals': {
+            'items': sum(row['items'] for row in by_status),
+            'bytes': sum(row['bytes'] for row in by_status),
+            'reclaimableItems': sum(row['items'] for row in by_status if row['reclaimable']),
+            'reclaimableBytes': sum(row['bytes'] for row in by_status if row['reclaimable'])
+        },
+        'byStatus': by_status,
+        'byLibrary': grouped(library, 'library', lambda key: tables[key].library),
+        'byYear': grouped(year, 'year', lambda key: None if key == NULL else key),
+        'byAddedAge': grouped(age, 'addedAge', ADDED_AGE_LABELS.__getitem__)
+    }
+
+def write_space_summary(summary, output_path):
+    """Summary CSV: one line per (group, status) with items and bytes"""
+    with open(output_path,'w',newline='',encoding='utf-8') as csvfile:
+        writer=csv.writer(csvfile)
+        writer.writerow(['Group By','Group','Status','Items','Bytes','Size','Reclaimable'])
+        for group_by, section, field in (('Status','byStatus',None),('Library','byLibrary','library'),
+                                         ('Year','byYear','year'),('Added','byAddedAge','addedAge')):
+            for row in summary[section]:
+                group = 'All' if field is None else 'Unknown' if row[field] is None else row[field]
+                writer.writerow([group_by,group,row['status'],row['items'],row['bytes'],
+                                 format_file_size(row['bytes']),'Yes' if row['reclaimable'] else 'No'])
+
+def latest_tables():
+    """Newest report table per library in the report store"""
+    latest = {}
+    for table in report_store.list():
+        latest[(table.library, table.kind)] = table
+    return list(latest.values())
+
+# Extra formats a report can be exported in next to its CSV (exportFormats)
+EXPORT_FORMATS = ('csv.gz', 'jsonl', 'jsonl.gz', 'parquet', 'arrow')
+COLUMNAR_FORMATS = ('parquet', 'arrow')
+# Report files served by /api/download and removed by /api/clear-reports
+REPORT_MIMETYPES = {
+    '.csv': 'text/csv',
+    '.jsonl': 'application/x-ndjson',
+    '.gz': 'application/gzip',
+    '.parquet': 'application/vnd.apache.parquet',
+    '.arrow': 'application/vnd.apache.arrow.file'
+}
+# Plain-text reports that are sent gzip-encoded when the client accepts it
+COMPRESSIBLE_EXTENSIONS = ('.csv', '.jsonl')
+COPY_CHUNK_SIZE = 1024 * 1024
+
+def parse_export_formats(value):
+    """exportFormats setting (list or comma-separated string) -> validated tuple"""
+    if isinstance(value, str):
+        value = value.split(',')
+    formats = []
+    for fmt in value or ():
+        fmt = str(fmt).strip().lower().lstrip('.')
+        if fmt in ('', 'csv') or fmt in formats:
+            continue
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"Unknown export format '{fmt}' (choose from {', '.join(EXPORT_FORMATS)})")
+        if fmt in COLUMNAR_FORMATS and importlib.util.find_spec('pyarrow') is None:
+            raise ValueError(f'The {fmt} export needs pyarrow installed')
+        formats.append(fmt)
+    return tuple(formats)
+
+def gzip_file(path, target=None):
+    """Stream a gzip copy of a file to target (default <path>.gz), replaced atomically"""
+    target = target or path + '.gz'
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(target), prefix='.', suffix='.tmp')
+    try:
+        with os.fdopen(fd,'wb') as raw, open(path,'rb') as src, \
+                gzip.GzipFile(os.path.basename(path), 'wb', 6, raw) as dst:
+            shutil.copyfileobj(src, dst, COPY_CHUNK_SIZE)
+        os.replace(tmp_path, target)
+    finally:
+        # Only still there if the copy failed
+        try:
+            os.unlink(tmp_path)
+        except FileNotFoundError:
+            pass
+    return target
+
+def compressed_copy(path):
+    """<path>.gz, (re)built when missing or older than the file itself"""
+    target = path + '.gz'
+    try:
+        if os.path.getmtime(target) >= os.path.getmtime(path):
+            return target
+    except OSError:
+        pass
+    return gzip_file(path, target)
+
+def write_jsonl(table, output_path, compress=False):
+    """One JSON object per row with typed values - ints, ISO dates in UTC, null for missing.
+
+    Dates carry their +00:00 offset, matching the UTC timestamps of the
+    Parquet/Arrow exports.
+    """
+    opener = gzip.open if compress else open
+    with opener(output_path,'wt',encoding='utf-8',newline='\n') as f:
+        for row_id in range(len(table)):
+            f.write(json.dumps(table.row(row_id, timezone.utc), ensure_ascii=False))
+            f.write('\n')
+
+def write_columnar(table, output_path, fmt):
+    """Parquet or Arrow IPC file straight from the table's typed columns"""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    fields, arrays = [], []
+    for name, col_type in table.columns:
+        column = table.data[name]
+        if col_type is str:
+            values = pa.array(column, type=pa.string())
+        else:
+            # Zero-copy view of the array('q') column, with NULL turned into real nulls
+            values = pa.Array.from_buffers(pa.int64(), len(column), [None, pa.py_buffer(column)])
+            values = pc.if_else(pc.equal(values, NULL), pa.scalar(None, pa.int64()), values)
+            if col_type is datetime:
+                values = values.cast(pa.timestamp('s', tz='UTC'))
+        fields.append(pa.field(name, values.type))
+        arrays.append(values)
+    metadata = {'reportId': table.id, 'library': table.library, 'kind': table.kind,
+                'createdAt': table.created_at.isoformat(timespec='seconds')}
+    data = pa.Table.from_arrays(arrays, schema=pa.schema(fields, metadata=metadata))
+
+    if fmt == 'parquet':
+        import pyarrow.parquet as pq
+        pq.write_table(data, output_path)
+    else:
+        with pa.OSFile(output_path,'wb') as sink, pa.ipc.new_file(sink, data.schema) as writer:
+            writer.write_table(data)
+
+def write_exports(table, csv_path, formats):
+    """Write a report's extra export formats next to its CSV"""
+    base = csv_path[:-len('.csv')] if csv_path.endswith('.csv') else csv_path
+    exports = []
+    for fmt in formats:
+        output_path = f'{base}.{fmt}'
+        with phase('export'):
+            if fmt == 'csv.gz':
+                gzip_file(csv_path, output_path)
+            elif fmt in ('jsonl', 'jsonl.gz'):
+                write_jsonl(table, output_path, compress=fmt.endswith('.gz'))
+            else:
+                write_columnar(table, output_path, fmt)
+        filename = os.path.basename(output_path)
+        exports.append({'format':fmt,'filename':filename,'path':f'/api/download/{filename}',
+                        'size':os.path.getsize(output_path)})
+    return exports
+
+class JobCancelled(Exception):
+    """Raised inside a report job when it has been cancelled"""
+
+_job_cancel_event = contextvars.ContextVar('job_cancel_event', default=None)
+
+@contextmanager
+def cancellable(cancel_event):
+    """Make check_cancelled() inside the block (and fetcher threads) watch cancel_event"""
+    token = _job_cancel_event.set(cancel_event)
+    try:
+        yield
+    finally:
+        _job_cancel_event.reset(token)
+
+def check_cancelled():
+    """Raise JobCancelled if the job running this code has been cancelled.
+
+    Progress updates already do this per item; long stretches without any
+    (history pages, library listing pages) call it directly.
+    """
+    event = _job_cancel_event.get()
+    if event is not None and event.is_set():
+        raise JobCancelled()
+
+class JobProgress(dict):
+    """Progress dict for one report job - every update raises JobCancelled once the job is cancelled"""
+
+    def __init__(self, cancel_event, **fields):
+        super().__init__(**fields)
+        self._lock = threading.Lock()
+        self.cancel_event = cancel_event
+
+    def __setitem__(self, key, value):
+        if self.cancel_event.is_set():
+            raise JobCancelled()
+        with self._lock:
+            super().__setitem__(key, value)
+
+    def update(self, *args, **kwargs):
+        if self.cancel_event.is_set():
+            raise JobCancelled()
+        with self._lock:
+            super().update(*args, **kwargs)
+
+    def cancel(self):
+        """Stop the job at its next progress update"""
+        self.cancel_event.set()
+
+    def set_library(self, lib_key, field, value):
+        """Update one field of one library's entry under 'libraries'.
+
+        Item counts are mirrored into the top-level current_library/current_item/
+        total_items fields for older clients - with several libraries running
+        at once those show whichever library updated last. A library starting
+        moves 'current' (1-based, as when libraries ran one at a time) and one
+        finishing moves 'libraries_done'.
+        """
+        if self.cancel_event.is_set():
+            raise JobCancelled()
+        with self._lock:
+            lib = self['libraries'][lib_key]
+            lib[field] = value
+            if field == 'status' and value == 'running':
+                dict.__setitem__(self, 'current', self['current'] + 1)
+            elif field == 'status' and value == 'done':
+                dict.__setitem__(self, 'libraries_done', self['libraries_done'] + 1)
+            if field in ('current_item', 'total_items'):
+                dict.__setitem__(self, 'current_library', lib['title'])
+                dict.__setitem__(self, 'current_item', lib['current_item'])
+                dict.__setitem__(self, 'total_items', lib['total_items'])
+
+    def library(self, lib_key):
+        return LibraryProgress(self, lib_key)
+
+    def snapshot(self):
+        with self._lock:
+            snapshot = dict(self)
+            snapshot['libraries'] = {key: dict(lib) for key, lib in self.get('libraries', {}).items()}
+            return snapshot
+
+class LibraryProgress:
+    """Progress dict handed to a report generator for one library of a job.
+
+    Writes such as progress_data['current_item'] = idx land in the job's
+    per-library entry (progress['libraries'][lib_key]), so libraries being
+    generated at the same time don't overwrite each other.
+    """
+
+    def __init__(self, job_progress, lib_key):
+        self._job_progress = job_progress
+        self._lib_key = lib_key
+
+    def __setitem__(self, field, value):
+        self._job_progress.set_library(self._lib_key, field, value)
+
+class ReportJob:
+    """One background report run: status, progress and result"""
+
+    def __init__(self, params):
+        self.id = uuid.uuid4().hex[:12]
+        self.params = params
+        self.status = 'queued'
+        self.result = None
+        self.error = None
+        self.created = datetime.now()
+        self.started = None
+        self.finished = None
+        self.cancel_event = threading.Event()
+        self.progress = JobProgress(self.cancel_event, current=0, total=0, libraries_done=0, current_library='',
+                                    libraries_order=[], current_item=0, total_items=0, libraries={})
+        self.future = None
+
+    @property
+    def done(self):
+        return self.status in ('completed', 'failed', 'cancelled')
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'status': self.status,
+            'progress': self.progress.snapshot(),
+            'result': self.result,
+            'error': self.error,
+            'created': self.created.isoformat(timespec='seconds'),
+            'started': self.started.isoformat(timespec='seconds') if self.started else None,
+            'finished': self.finished.isoformat(timespec='seconds') if self.finished else None
+        }
+
+class JobManager:
+    """Runs report jobs on a small thread pool.
+
+    At most `max_concurrent` jobs run at once; the rest wait as 'queued'.
+    Finished jobs are kept (status, result, error) until more than `retention`
+    have piled up, oldest first out.
+    """
+
+    def __init__(self, max_concurrent=MAX_CONCURRENT_JOBS, retention=JOB_RETENTION):
+        self.retention = retention
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_concurrent), thread_name_prefix='report-job')
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, fn, params):
+        job = ReportJob(params)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._prune()
+        job.future = self._executor.submit(self._run, job, fn)
+        return job
+
+    def _run(self, job, fn):
+        if job.cancel_event.is_set():
+            job.status = 'cancelled'
+            job.finished = datetime.now()
+            return
+        job.status = 'running'
+        job.started = datetime.now()
+        try:
+            job.result = fn(job.params, job.progress)
+            job.status = 'completed'
+        except JobCancelled:
+            job.status = 'cancelled'
+        except Exception as e:
+            job.error = str(e)
+            job.status = 'failed'
+        finally:
+            job.finished = datetime.now()
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def latest(self):
+        with self._lock:
+            return max(self._jobs.values(), key=lambda job: job.created, default=None)
+
+    def list(self):
+        with self._lock:
+            return sorted(self._jobs.values(), key=lambda job: job.created, reverse=True)
+
+    def cancel(self, job_id):
+        job = self.get(job_id)
+        if job is None:
+            return None
+        if not job.done:
+            job.cancel_event.set()
+            if job.future is not None and job.future.cancel():
+                # Never started - mark it here since _run won't be called
+                job.status = 'cancelled'
+                job.finished = datetime.now()
+        return job
+
+    def _prune(self):
+        finished = sorted((job for job in self._jobs.values() if job.done), key=lambda job: job.created)
+        for job in finished[:max(0, len(finished) - self.retention)]:
+            del self._jobs[job.id]
+
+jobs = JobManager()
+
 @app.route('/')
 def index():
     return render_template_string(HTML_TEMPLATE)
@@ -82,267 +1802,580 @@ def get_config():
 
 @app.route('/api/config',methods=['POST'])
 def update_config():
-    save_config(request.json)
+    # Merge, so settings the UI doesn't edit (servers, exportFormats, ...) survive a save
+    config=load_config()
+    config.update(request.json or {})
+    save_config(config)
     return jsonify({'success':True})
 
 @app.route('/api/libraries',methods=['GET'])
 def scan_libraries():
-    """Scan Plex libraries using PlexAPI - SAFE"""
+    """Scan Plex libraries using PlexAPI - SAFE
+
+    Served from the library cache; pass ?refresh=1 to re-list from Plex, or
+    ?cached=1 to never connect (scanned is false until a scan has run).
+    """
     try:
-        plex = get_plex_connection()
-        sections = plex.library.sections()
-        libraries = [{'key': section.key, 'title': section.title, 'type': section.type} for section in sections]
-        return jsonify({'libraries': libraries})
+        if request.args.get('cached','').lower() in ('1','true','yes'):
+            listing = plex_connections.cached_libraries()
+            return jsonify({'libraries': listing or [], 'scanned': listing is not None})
+        refresh = request.args.get('refresh','').lower() in ('1','true','yes')
+        return jsonify({'libraries': plex_connections.libraries(refresh=refresh), 'scanned': True})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/generate',methods=['POST'])
 def generate_reports():
-    """Generate reports using PlexAPI - SAFE, no database access"""
-    global progress_data
+    """Start a background report job - returns its job ID right away.
+
+    Pass "wait": true to block until the job finishes and get the reports back
+    in the same response (the pre-job behaviour, handy for scripts).
+    """
+    data=request.json or {}
+    try:
+        parse_export_formats(data.get('exportFormats',load_config().get('exportFormats',())))
+    except ValueError as e:
+        return jsonify({'error':str(e)}),400
+    job=jobs.submit(run_reports,data)
     
-    data=request.json
+    if data.get('wait'):
+        try:
+            job.future.result()
+        except CancelledError:
+            pass
+        if job.status!='completed':
+            return jsonify({'error':job.error or job.status,'jobId':job.id}),500
+        return jsonify(dict(job.result,jobId=job.id))
+    
+    return jsonify({'jobId':job.id,'status':job.status,'progress':f'/api/progress/{job.id}'}),202
+
+def run_reports(data, progress_data):
+    """Generate reports using PlexAPI - SAFE, no database access
+
+    Up to `parallelLibraries` libraries are generated at the same time; each
+    one reports its own progress under progress_data['libraries'][key], and
+    results always come back in UI order.
+    """
     config=load_config()
-    exclude_days=config.get('excludeDays',30)
-    stale_days=config.get('staleDays',730)
+    exclude_days=data.get('excludeDays',config.get('excludeDays',30))
+    stale_days=data.get('staleDays',config.get('staleDays',730))
     selected_libraries=data.get('selectedLibraries',{})
     library_types=data.get('libraryTypes',{})
     libraries_order=data.get('librariesOrder',[])  # Get order from frontend
+    full_resync=bool(data.get('fullResync',False))  # Re-download all history instead of syncing
+    bulk_listing=config.get('bulkEpisodeListing',True)  # List TV episodes library-wide instead of per season
+    parallel=max(1,int(data.get('parallelLibraries',config.get('parallelLibraries',PARALLEL_LIBRARIES))))
+    incremental=bool(data.get('incremental',config.get('incrementalReports',True)))  # Reuse unchanged rows from the last run
+    delta_report=bool(data.get('deltaReport',config.get('deltaReport',False)))  # Also write a CSV of status changes
+    export_formats=parse_export_formats(data.get('exportFormats',config.get('exportFormats',())))  # e.g. ['jsonl','parquet']
     
     os.makedirs(REPORTS_DIR,exist_ok=True)
-    results=[]
     
     # Initialize progress - get selected libraries in order
     selected_libs = [str(k) for k in libraries_order if selected_libraries.get(str(k))]
-    progress_data = {
+    progress_data.update({
         'current': 0,
         'total': len(selected_libs),
+        'libraries_done': 0,
         'current_library': '',
         'libraries_order': selected_libs,
         'current_item': 0,
-        'total_items': 0
-    }
+        'total_items': 0,
+        'libraries': {key: {'title': '', 'type': library_types.get(key,'movie'), 'status': 'queued',
+                            'current_item': 0, 'total_items': 0} for key in selected_libs}
+    })
     
-    try:
-        plex = get_plex_connection()
+    # The shared connection: one pooled, throttled session and thread pool for all Plex requests
+    with cancellable(progress_data.cancel_event), plex_connections.lease() as conn:
+        fetcher = conn.fetcher
         cutoff_date = datetime.now() - timedelta(days=exclude_days)
         stale_cutoff = datetime.now() - timedelta(days=stale_days)
+        snapshots = SnapshotStore(SNAPSHOT_DB_FILE) if incremental or delta_report else None
+        tables = {}
         
-        # Process in the order libraries appear in the UI
-        for idx, lib_key in enumerate(selected_libs, start=1):
+        def run_library(lib_key):
             lib_type=library_types.get(lib_key,'movie')
-            section = plex.library.sectionByID(int(lib_key))
-            
-            # Update progress
-            progress_data['current'] = idx
-            progress_data['current_library'] = section.title
-            progress_data['current_item'] = 0
-            progress_data['total_items'] = 0
-            
-            timestamp=datetime.now().strftime("%Y-%m-%d")
-            sanitized_name="".join(c for c in section.title if c.isalnum() or c in(' ','-','_')).rstrip()
-            filename=f"{sanitized_name}_{timestamp}.csv"
-            output_path=os.path.join(REPORTS_DIR,filename)
-            
-            if lib_type=='movie':
-                item_count=generate_movie_report_plexapi(section, output_path, cutoff_date, stale_cutoff, progress_data)
-            else:
-                item_count=generate_tv_report_plexapi(section, output_path, cutoff_date, stale_cutoff, progress_data)
-            
-            results.append({'library':section.title,'filename':filename,'itemCount':item_count,'path':f'/api/download/{filename}'})
+            lib_progress=progress_data.library(lib_key)
+            try:
+                section = conn.section(lib_key)
+                lib_progress['title'] = section.title
+                lib_progress['status'] = 'running'
+                
+                timestamp=datetime.now().strftime("%Y-%m-%d")
+                sanitized_name="".join(c for c in section.title if c.isalnum() or c in(' ','-','_')).rstrip()
+                filename=f"{sanitized_name}_{timestamp}.csv"
+                output_path=os.path.join(REPORTS_DIR,filename)
+                
+                # Last run's rows - only new or changed items are rebuilt (fullResync rebuilds everything)
+                snapshot = snapshots.open(section, lib_type, rebuild=full_resync or not incremental) if snapshots else None
+                result = {'library':section.title,'filename':filename,'path':f'/api/download/{filename}'}
+                table = ReportTable(lib_type, section.title)
+                
+                # Time each phase and count Plex requests for this library
+                with collect_stats() as stats:
+                    try:
+                        if lib_type=='movie':
+                            item_count=generate_movie_report_plexapi(section, output_path, cutoff_date, stale_cutoff, lib_progress, full_resync=full_resync, fetcher=fetcher, snapshot=snapshot, table=table)
+                        else:
+                            item_count=generate_tv_report_plexapi(section, output_path, cutoff_date, stale_cutoff, lib_progress, full_resync=full_resync, fetcher=fetcher, bulk=bulk_listing, snapshot=snapshot, table=table)
+                        if snapshot:
+                            # Changes are read against the previous run's rows, which save() drops
+                            if delta_report and snapshot.has_previous:
+                                changes_filename=f"{sanitized_name}_{timestamp}_changes.csv"
+                                change_count=write_changes_report(snapshot, os.path.join(REPORTS_DIR,changes_filename))
+                                result['changes'] = {'filename':changes_filename,'count':change_count,'path':f'/api/download/{changes_filename}'}
+                            snapshot.save()
+                    except BaseException:
+                        if snapshot:
+                            snapshot.discard()
+                        raise
+                    
+                    if snapshot:
+                        result['incremental'] = snapshot.summary()
+                    # gzip/JSON Lines/columnar copies, written from the typed rows rather than re-parsing the CSV
+                    if export_formats:
+                        result['exports'] = write_exports(table, output_path, export_formats)
+                    result['itemCount'] = item_count
+                    result['metrics'] = stats.summary(section.title, lib_type, item_count)
+                
+                # Keep the typed rows queryable through /api/reports/<id>/rows
+                report_store.add(table.finish())
+                tables[lib_key] = table
+                result['reportId'] = table.id
+                result['rows'] = f'/api/reports/{table.id}/rows'
+                
+                lib_progress['status'] = 'done'
+                return result
+            except JobCancelled:
+                raise
+            except Exception:
+                lib_progress['status'] = 'failed'
+                raise
         
-        return jsonify({'reports':results})
-    except Exception as e:
-        return jsonify({'error':str(e)}),500
-
-@app.route('/api/progress',methods=['GET'])
-def get_progress():
-    """Get current progress of report generation"""
-    return jsonify(progress_data)
-
-def generate_movie_report_plexapi(section, output_path, cutoff_date, stale_cutoff, progress_data):
-    """Generate movie report using PlexAPI"""
-    # Get all movies first to count them
-    all_movies = [m for m in section.all() if m.addedAt <= cutoff_date]
-    progress_data['total_items'] = len(all_movies)
-    
-    # Collect all movie data first
-    movie_data = []
-    for idx, movie in enumerate(all_movies, start=1):
-        progress_data['current_item'] = idx
-        
-        year = movie.year if hasattr(movie, 'year') else 'Unknown'
-        date_added = movie.addedAt.strftime('%Y-%m-%d %H:%M:%S') if movie.addedAt else 'Unknown'
-        
-        # Get full viewing history across ALL users (this also gives us per-play timestamps)
-        history = movie.history()
-        play_count = len(history)
+        # Libraries finish in any order; results are collected back in UI order
+        with ThreadPoolExecutor(max_workers=parallel, thread_name_prefix='report-library') as pool:
+            # Each library thread gets a copy of this context, so check_cancelled() works there too
+            futures=[pool.submit(contextvars.copy_context().run, run_library, lib_key) for lib_key in selected_libs]
+            try:
+                for future in as_completed(futures):
+                    future.result()
+            except BaseException as e:
+                for future in futures:
+                    future.cancel()
+                if not isinstance(e, JobCancelled):
+                    # First library failure: stop the libraries still running too, the job fails with this error
+                    progress_data.cancel()
+                raise
         
-        # Pull the most recent watch date out of the same history call - no extra API calls needed
-        watch_dates = [h.viewedAt for h in history if getattr(h, 'viewedAt', None)]
-        last_watched_dt = max(watch_dates) if watch_dates else None
-        last_watched = last_watched_dt.strftime('%Y-%m-%d %H:%M:%S') if last_watched_dt else 'Never'
+        reports=[future.result() for future in futures]
         
-        if play_count == 0:
-            status = 'Never Watched'
-        elif last_watched_dt is None:
-            status = 'Recently Watched'
-        elif last_watched_dt < stale_cutoff:
-            status = 'Stale'
+        # Disk space by status/library/year/age across everything generated in this run
+        summary=summarize_space([tables[key] for key in selected_libs])
+        summary['filename']=f"Space_Summary_{datetime.now().strftime('%Y-%m-%d')}.csv"
+        summary['path']=f"/api/download/{summary['filename']}"
+        write_space_summary(summary, os.path.join(REPORTS_DIR,summary['filename']))
+        return {'reports':reports,'summary':summary}
+
+@app.route('/api/progress',methods=['GET'])
+@app.route('/api/progress/<job_id>',methods=['GET'])
+def get_progress(job_id=None):
+    """Get progress of a report job (the most recent one if no ID is given)"""
+    job=jobs.get(job_id) if job_id else jobs.latest()
+    if job is None:
+        return jsonify({'error':'Job not found'}),404
+    return jsonify(dict(job.progress.snapshot(),jobId=job.id,status=job.status))
+
+@app.route('/api/jobs',methods=['GET'])
+def list_jobs():
+    return jsonify({'jobs':[job.to_dict() for job in jobs.list()]})
+
+@app.route('/api/jobs/<job_id>',methods=['GET'])
+def get_job(job_id):
+    job=jobs.get(job_id)
+    if job is None:
+        return jsonify({'error':'Job not found'}),404
+    return jsonify(job.to_dict())
+
+@app.route('/api/jobs/<job_id>/cancel',methods=['POST'])
+def cancel_job(job_id):
+    job=jobs.cancel(job_id)
+    if job is None:
+        return jsonify({'error':'Job not found'}),404
+    return jsonify(job.to_dict())
+
+@app.route('/api/reports',methods=['GET'])
+def list_reports():
+    """Reports held in memory for querying (newest last)"""
+    return jsonify({'reports':[table.summary() for table in report_store.list()]})
+
+@app.route('/api/reports/<report_id>',methods=['GET'])
+def get_report(report_id):
+    table=report_store.get(report_id)
+    if table is None:
+        return jsonify({'error':'Report not found'}),404
+    return jsonify(table.summary())
+
+@app.route('/api/summary',methods=['GET'])
+def space_summary():
+    """Reclaimable space across reports - ?reports=id1,id2, default the newest report per library"""
+    report_ids=[report_id for report_id in request.args.get('reports','').split(',') if report_id]
+    if report_ids:
+        tables=[report_store.get(report_id) for report_id in report_ids]
+        if None in tables:
+            return jsonify({'error':'Report not found'}),404
+    else:
+        tables=latest_tables()
+    return jsonify(summarize_space(tables))
+
+def parse_report_query(table, args):
+    """Turn /rows query parameters into ReportTable.query() arguments.
+
+    <column>=a,b       rows whose column equals any of the values
+    min<Column>=, max<Column>=   inclusive range on a number or date (ISO date or epoch seconds)
+    search=text        case-insensitive substring of any text column
+    sort=-fileSize,title        sort keys, "-" for descending
+    """
+    equals, ranges, sort = [], [], []
+    bounds = {}
+
+    def parse(name, param, text):
+        try:
+            return table.parse_value(name, text)
+        except (ValueError, OverflowError):
+            raise ValueError(f'Invalid value for {param}') from None
+
+    for param, text in args.items():
+        if param in ('sort','limit','cursor','search'):
+            continue
+        if param in table.types:
+            equals.append((param, [parse(param, param, value) for value in text.split(',')]))
+            continue
+        for prefix, position in (('min',0),('max',1)):
+            name = param[len(prefix):len(prefix)+1].lower() + param[len(prefix)+1:]
+            if param.startswith(prefix) and name in table.types and table.types[name] is not str:
+                bounds.setdefault(name, [None, None])[position] = parse(name, param, text)
+                break
         else:
-            status = 'Recently Watched'
-        
-        # Get file info
-        file_path = 'Unknown'
-        file_size = 0
-        if movie.media:
-            for media in movie.media:
-                if media.parts:
-                    file_path = media.parts[0].file
-                    file_size = media.parts[0].size or 0
-                    break
-        
-        # Ensure title is treated as text by prepending tab character for numeric-only titles
-        title = movie.title
-        if title.strip().replace('-','').replace('.','').isdigit():
-            title = '\t' + title
-        
-        movie_data.append({
-            'title': title,
-            'year': year,
-            'date_added': date_added,
-            'date_added_sort': movie.addedAt if movie.addedAt else datetime.min,
-            'play_count': play_count,
-            'last_watched': last_watched,
-            'status': status,
-            'file_path': file_path,
-            'file_size': format_file_size(file_size)
-        })
+            raise ValueError(f'Unknown query parameter: {param}')
+    ranges = [(name, low, high) for name, (low, high) in bounds.items()]
+    for key in filter(None, args.get('sort','').split(',')):
+        name = key.lstrip('-')
+        if name not in table.types:
+            raise ValueError(f'Unknown sort column: {name}')
+        sort.append((name, key.startswith('-')))
+    return {'equals':equals,'ranges':ranges,'search':args.get('search') or None,'sort':sort}
+
+@app.route('/api/reports/<report_id>/rows',methods=['GET'])
+def query_report(report_id):
+    """Filtered, sorted, cursor-paginated rows of a generated report"""
+    table=report_store.get(report_id)
+    if table is None:
+        return jsonify({'error':'Report not found'}),404
+    try:
+        query=parse_report_query(table, request.args)
+        try:
+            limit=min(max(1,int(request.args.get('limit',QUERY_PAGE_SIZE))),MAX_QUERY_PAGE_SIZE)
+        except ValueError:
+            raise ValueError('Invalid value for limit') from None
+        row_ids,token=table.query(**query)
+        offset=decode_cursor(request.args['cursor'],token) if request.args.get('cursor') else 0
+    except ValueError as e:
+        return jsonify({'error':str(e)}),400
     
-    # Sort by play count (low to high), then by date added (low to high)
-    movie_data.sort(key=lambda x: (x['play_count'], x['date_added_sort']))
+    page=row_ids[offset:offset+limit]
+    next_offset=offset+len(page)
+    return jsonify({
+        'reportId':table.id,
+        'total':len(row_ids),
+        'rows':[table.row(row_id) for row_id in page],
+        'nextCursor':encode_cursor(token,next_offset) if next_offset<len(row_ids) else None
+    })
+
+def generate_movie_report_plexapi(section, output_path, cutoff_date, stale_cutoff, progress_data, history=None, full_resync=False, fetcher=None, snapshot=None, table=None):
+    """Generate movie report using PlexAPI
+
+    Movies are streamed page by page and reduced to compact row tuples, and the
+    final sort spills to disk for huge libraries, so memory stays flat no
+    matter how big the library is. With a snapshot, unchanged movies reuse the
+    file info from the last run; with a table, the typed rows are also kept
+    for /api/reports queries.
+    """
+    # Viewing history across ALL users comes from the local history store, which
+    # only downloads plays newer than the last sync
+    if history is None:
+        with phase('history'):
+            history = load_section_history(section, full_resync, fetcher)
     
-    # Write sorted data to CSV
-    with open(output_path,'w',newline='',encoding='utf-8') as csvfile:
-        writer=csv.writer(csvfile)
-        writer.writerow(['Title','Year','Date Added','Play Count','Last Watched','Status','File Path','File Size'])
+    with ExternalSorter() as sorter, phase('rows'):
+        movies = timed(iter_section_items(section, 'movie', fetcher=fetcher, progress_data=progress_data), 'listing')
+        for idx, movie in enumerate(movies, start=1):
+            progress_data['current_item'] = idx
+            if movie.addedAt and movie.addedAt > cutoff_date:
+                continue
+            
+            year = movie.year if hasattr(movie, 'year') else 'Unknown'
+            
+            # Look up plays and the most recent watch date in the bulk history index
+            play_count = history.play_count(movie.ratingKey)
+            last_watched_dt = history.last_viewed(movie.ratingKey)
+            
+            if play_count == 0:
+                status = 'Never Watched'
+            elif last_watched_dt is None:
+                status = 'Recently Watched'
+            elif last_watched_dt < stale_cutoff:
+                status = 'Stale'
+            else:
+                status = 'Recently Watched'
+            
+            # Get file info - unchanged movies reuse last run's, skipping the media XML parse
+            fingerprint = item_fingerprint(movie, part=True) if snapshot else None
+            reused = snapshot.reuse(movie.ratingKey, fingerprint) if snapshot else None
+            if reused is not None:
+                file_path, file_size, total_size = reused
+            else:
+                file_path = 'Unknown'
+                file_size = 0
+                if movie.media:
+                    for media in movie.media:
+                        if media.parts:
+                            file_path = media.parts[0].file
+                            file_size = media.parts[0].size or 0
+                            break
+                # Every version and part counts towards the space the movie takes up
+                total_size = media_size(movie)
+            
+            if snapshot:
+                snapshot.record(movie.ratingKey, fingerprint, [file_path, file_size, total_size], text_cell(movie.title), status, reused is not None)
+            
+            # Sort by play count (low to high), then by date added (low to high).
+            # Rows stay typed until they are written out
+            sort_key = (play_count, movie.addedAt if movie.addedAt else datetime.min)
+            sorter.add(sort_key, (
+                movie.title,
+                year,
+                movie.addedAt,
+                play_count,
+                last_watched_dt,
+                status,
+                file_path,
+                file_size,
+                total_size
+            ))
+        
+        # Write sorted data to CSV (and into the queryable table, if one was given)
+        with phase('csv_write'), open(output_path,'w',newline='',encoding='utf-8') as csvfile:
+            writer=csv.writer(csvfile)
+            writer.writerow(MOVIE_CSV_HEADER)
+            writer.writerows(map(format_movie_row, table.collect(sorter) if table is not None else sorter))
         
-        for movie in movie_data:
-            writer.writerow([
-                movie['title'],
-                movie['year'],
-                movie['date_added'],
-                movie['play_count'],
-                movie['last_watched'],
-                movie['status'],
-                movie['file_path'],
-                movie['file_size']
-            ])
+        return sorter.count
+
+# The parts of a season a TV report needs - plexapi Season objects are dropped as soon as these are read
+SeasonInfo = namedtuple('SeasonInfo', 'rating_key show_title number added_at year leaf_count fingerprint')
+
+def season_info(season, show_title, snapshot=None):
+    if snapshot:
+        snapshot.observe(season._data.get('updatedAt'))
+    return SeasonInfo(season.ratingKey, show_title, season.seasonNumber, season.addedAt, season.year,
+                      season.leafCount, item_fingerprint(season) if snapshot else None)
+
+def iter_tv_seasons(section, cutoff_date, progress_data, fetcher=None, bulk=True, snapshot=None):
+    """Yield (season, episode_keys, size, reused) per season, season being a SeasonInfo.
+
+    `size` is the total bytes of every media part of the season's episodes.
+    With bulk=True seasons and episodes come from paged library-wide listings
+    and episodes are grouped under their season as they stream past.
+    bulk=False walks show.seasons() and season.episodes() instead. With a
+    snapshot, seasons whose fingerprint is unchanged and none of whose
+    episodes were updated since the last run reuse the episode keys and size
+    from that run; only the other seasons have their episodes listed.
+    """
+    # Seasons with an episode updated (replaced, re-keyed, re-analysed) since the last run
+    updated = set()
+    if snapshot is not None and snapshot.reuse_enabled and snapshot.previous_watermark:
+        since = snapshot.previous_watermark - UPDATED_SLACK
+        for episode in timed(iter_updated_episodes(section, since), 'listing'):
+            snapshot.observe(episode.get('updatedAt'))
+            updated.add(int(episode.get('parentRatingKey') or 0))
     
-    return len(movie_data)
-
-def generate_tv_report_plexapi(section, output_path, cutoff_date, stale_cutoff, progress_data):
-    """Generate TV show report using PlexAPI"""
-    # Get all shows and seasons first to count them
-    all_seasons = []
-    for show in section.all():
-        for season in show.seasons():
-            if not season.addedAt or season.addedAt <= cutoff_date:
-                all_seasons.append((show, season))
+    def known_episodes(season):
+        if snapshot is None:
+            return None
+        return snapshot.reuse(season.rating_key, season.fingerprint, stale=season.rating_key in updated)
     
-    progress_data['total_items'] = len(all_seasons)
+    def observe(episode):
+        if snapshot is not None:
+            snapshot.observe(episode._data.get('updatedAt'))
     
-    # Collect all season data first
-    season_data = []
-    for idx, (show, season) in enumerate(all_seasons, start=1):
-        progress_data['current_item'] = idx
-        
-        episodes = season.episodes()
-        total_episodes = len(episodes)
-        
-        # Get watched count and most recent watch date across ALL users using history()
-        # (history() is already being called per episode for the watched count, so we
-        # reuse that same result to find the last-watched date - no extra API calls)
-        watched_episodes = 0
-        last_watched_dt = None
+    def list_episodes(season):
+        episodes = section.fetchItems(f'/library/metadata/{season.rating_key}/children')
         for ep in episodes:
-            ep_history = ep.history()
-            if ep_history:
-                watched_episodes += 1
-                ep_watch_dates = [h.viewedAt for h in ep_history if getattr(h, 'viewedAt', None)]
-                if ep_watch_dates:
-                    ep_last = max(ep_watch_dates)
-                    if last_watched_dt is None or ep_last > last_watched_dt:
-                        last_watched_dt = ep_last
+            observe(ep)
+        return [[ep.ratingKey for ep in episodes], sum(media_size(ep) for ep in episodes)]
+    
+    if bulk:
+        # List every season of the library, then stream every episode and group
+        # it under its season by parentRatingKey
+        seasons = [season_info(season, season.parentTitle, snapshot)
+                   for season in timed(iter_section_items(section, 'season', fetcher=fetcher), 'listing')
+                   if not season.addedAt or season.addedAt <= cutoff_date]
+        changed = [season for season in seasons if known_episodes(season) is None]
         
-        watched_status = 'Yes' if watched_episodes > 0 else 'No'
-        last_watched = last_watched_dt.strftime('%Y-%m-%d %H:%M:%S') if last_watched_dt else 'Never'
+        # season ratingKey -> [episode keys, total bytes], only for seasons that need listing
+        episode_data = {season.rating_key: [[], 0] for season in changed}
+        listing_pages = -(-sum(season.leaf_count or 0 for season in seasons) // LISTING_PAGE_SIZE)
+        if changed and len(changed) <= listing_pages:
+            # Only a few seasons changed - listing just those is cheaper than the whole library
+            progress_data['total_items'] = len(changed)
+            season_lists = fetch_map(fetcher, lambda season: (season.rating_key, list_episodes(season)), changed)
+            for idx, (season_key, data) in enumerate(timed(season_lists, 'episodes'), start=1):
+                progress_data['current_item'] = idx
+                episode_data[season_key] = data
+        elif changed:
+            episodes = timed(iter_section_items(section, 'episode', fetcher=fetcher, progress_data=progress_data), 'listing')
+            for idx, ep in enumerate(episodes, start=1):
+                progress_data['current_item'] = idx
+                data = episode_data.get(ep.parentRatingKey)
+                observe(ep)
+                if data is not None:
+                    data[0].append(ep.ratingKey)
+                    data[1] += media_size(ep)
         
-        if watched_episodes == 0:
-            status = 'Never Watched'
-        elif last_watched_dt is None:
-            status = 'Recently Watched'
-        elif last_watched_dt < stale_cutoff:
-            status = 'Stale'
-        else:
-            status = 'Recently Watched'
+        for season in seasons:
+            data = episode_data.pop(season.rating_key, None)
+            reused = data is None
+            if reused:
+                # Looked up again rather than held for every season since the check above
+                data = known_episodes(season)
+            yield (season, data[0], data[1], reused)
+    else:
+        # Walk show -> seasons -> episodes (seasons and episodes are fetched concurrently,
+        # results come back in show order)
+        shows = timed(iter_section_items(section, 'show', fetcher=fetcher, progress_data=progress_data), 'listing')
+        show_seasons = timed(fetch_map(fetcher, lambda show: (show.title, show.seasons()), shows), 'seasons')
         
-        date_added = season.addedAt.strftime('%Y-%m-%d %H:%M:%S') if season.addedAt else 'Unknown'
+        def wanted_seasons():
+            for idx, (show_title, seasons) in enumerate(show_seasons, start=1):
+                progress_data['current_item'] = idx
+                for season in seasons:
+                    if not season.addedAt or season.addedAt <= cutoff_date:
+                        yield season_info(season, show_title, snapshot)
         
-        # Ensure show title is treated as text by prepending tab character for numeric-only titles
-        show_title = show.title
-        if show_title.strip().replace('-','').replace('.','').isdigit():
-            show_title = '\t' + show_title
+        def season_episodes(season):
+            data = known_episodes(season)
+            if data is not None:
+                return season, data, True
+            return season, list_episodes(season), False
         
-        season_data.append({
-            'show_title': show_title,
-            'season_number': f"Season {season.seasonNumber}",
-            'season_number_int': season.seasonNumber,
-            'watched_status': watched_status,
-            'total_episodes': total_episodes,
-            'watched_episodes': watched_episodes,
-            'last_watched': last_watched,
-            'status': status,
-            'date_added': date_added
-        })
-    
-    # Sort by: Watched Status (No first), Show Title (A-Z), Season Number (A-Z)
-    season_data.sort(key=lambda x: (x['watched_status'], x['show_title'], x['season_number_int']))
+        for season, data, reused in timed(fetch_map(fetcher, season_episodes, wanted_seasons()), 'episodes'):
+            yield (season, data[0], data[1], reused)
+
+def tally_season(episode_keys, history):
+    """Total episodes, watched episodes and last watched date for one season"""
+    watched = 0
+    last_watched = None
+    for ep_key in episode_keys:
+        # Watched count and most recent watch date across ALL users come from the
+        # bulk history index (no per-episode requests)
+        if history.play_count(ep_key):
+            watched += 1
+            ep_last = history.last_viewed(ep_key)
+            if ep_last and (last_watched is None or ep_last > last_watched):
+                last_watched = ep_last
+    return len(episode_keys), watched, last_watched
+
+def generate_tv_report_plexapi(section, output_path, cutoff_date, stale_cutoff, progress_data, history=None, full_resync=False, fetcher=None, bulk=True, snapshot=None, table=None):
+    """Generate TV show report using PlexAPI
+
+    With bulk=True (default) seasons and episodes come from paged library-wide
+    listings; bulk=False walks show.seasons() and season.episodes() instead.
+    Either way rows are streamed into a disk-backed sort, so memory stays flat.
+    With a snapshot, only seasons that changed since the last run are re-listed;
+    with a table, the typed rows are also kept for /api/reports queries.
+    """
+    # Viewing history across ALL users comes from the local history store, which
+    # only downloads plays newer than the last sync
+    if history is None:
+        with phase('history'):
+            history = load_section_history(section, full_resync, fetcher)
     
-    # Write sorted data to CSV
-    with open(output_path,'w',newline='',encoding='utf-8') as csvfile:
-        writer=csv.writer(csvfile)
-        writer.writerow(['Show Title','Season Number','Watched Status','Total Episodes','Episodes Watched','Last Watched','Status','Date Added'])
+    with ExternalSorter() as sorter, phase('rows'):
+        for season, episode_keys, size, reused in iter_tv_seasons(
+                section, cutoff_date, progress_data, fetcher, bulk, snapshot):
+            total_episodes, watched_episodes, last_watched_dt = tally_season(episode_keys, history)
+            watched_status = 'Yes' if watched_episodes > 0 else 'No'
+            
+            if watched_episodes == 0:
+                status = 'Never Watched'
+            elif last_watched_dt is None:
+                status = 'Recently Watched'
+            elif last_watched_dt < stale_cutoff:
+                status = 'Stale'
+            else:
+                status = 'Recently Watched'
+            
+            if snapshot:
+                snapshot.record(season.rating_key, season.fingerprint, [episode_keys, size],
+                                f"{season.show_title} - Season {season.number}", status, reused)
+            
+            # Sort by: Watched Status (No first), Show Title (A-Z, as written to the CSV), Season Number (A-Z)
+            sort_key = (watched_status, text_cell(season.show_title), season.number)
+            sorter.add(sort_key, (
+                season.show_title,
+                season.number,
+                watched_status,
+                total_episodes,
+                watched_episodes,
+                last_watched_dt,
+                status,
+                season.added_at,
+                size,
+                season.year
+            ))
         
-        for season in season_data:
-            writer.writerow([
-                season['show_title'],
-                season['season_number'],
-                season['watched_status'],
-                season['total_episodes'],
-                season['watched_episodes'],
-                season['last_watched'],
-                season['status'],
-                season['date_added']
-            ])
-    
-    return len(season_data)
+        # Write sorted data to CSV (and into the queryable table, if one was given)
+        with phase('csv_write'), open(output_path,'w',newline='',encoding='utf-8') as csvfile:
+            writer=csv.writer(csvfile)
+            writer.writerow(TV_CSV_HEADER)
+            writer.writerows(map(format_tv_row, table.collect(sorter) if table is not None else sorter))
+        
+        return sorter.count
 
 @app.route('/api/download/<filename>',methods=['GET'])
 def download_report(filename):
-    file_path=os.path.join(REPORTS_DIR,filename)
-    if os.path.exists(file_path):
-        return send_file(file_path,as_attachment=True)
-    return jsonify({'error':'File not found'}),404
+    """Stream a report file in chunks, with Range and ETag/If-Modified-Since support
+
+    CSV and JSON Lines reports go out gzip-encoded to clients that send
+    Accept-Encoding: gzip, from a .gz copy kept next to the report.
+    """
+    file_path=safe_join(REPORTS_DIR,filename)
+    if file_path is None or not os.path.isfile(file_path):
+        return jsonify({'error':'File not found'}),404
+    
+    extension=os.path.splitext(filename)[1].lower()
+    mimetype=REPORT_MIMETYPES.get(extension,'application/octet-stream')
+    compressible=extension in COMPRESSIBLE_EXTENSIONS
+    encoded=compressible and request.accept_encodings.quality('gzip')>0
+    if encoded:
+        file_path=compressed_copy(file_path)
+    
+    response=send_file(file_path,mimetype=mimetype,as_attachment=True,download_name=filename,conditional=True)
+    if encoded:
+        response.headers['Content-Encoding']='gzip'
+    if compressible:
+        response.vary.add('Accept-Encoding')
+    return response
 
 @app.route('/api/clear-reports',methods=['POST'])
 def clear_reports():
     try:
         deleted=0
         for filename in os.listdir(REPORTS_DIR):
-            if filename.endswith('.csv'):
+            if os.path.splitext(filename)[1].lower() in REPORT_MIMETYPES:
                 os.remove(os.path.join(REPORTS_DIR,filename))
                 deleted+=1
+        report_store.clear()
         return jsonify({'deleted':deleted})
     except Exception as e:
         return jsonify({'error':str(e)}),500
@@ -375,6 +2408,11 @@ def handle_sigterm(signum, frame):
     print("Received SIGTERM, shutting down gracefully...")
     sys.exit(0)
 
+@app.route('/api/metrics',methods=['GET'])
+def metrics():
+    """Report engine metrics in Prometheus text format"""
+    return METRICS.render(),200,{'Content-Type':'text/plain; version=0.0.4; charset=utf-8'}
+
 @app.route('/health',methods=['GET'])
 def health():
     return jsonify({'status':'healthy'})
@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+"""
+Plex Unwatched Reporter - local stand-in Plex server for benchmarks
+Copyright (C) 2025 Thad A. Williams
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published
+by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+from xml.sax.saxutils import quoteattr
+from collections import Counter
+import itertools
+import random
+import threading
+import time
+
+MOVIE_SECTION = '1'
+TV_SECTION = '2'
+
+# Plex type numbers used by /library/sections/<key>/all?type=N
+PLEX_TYPES = {'1': 'movie', '2': 'show', '3': 'season', '4': 'episode'}
+
+# ratingKey ranges - every item's key is derived from its position, so nothing
+# but the watch history has to be kept in memory
+SHOW_BASE = 10_000_000
+SEASON_BASE = 20_000_000
+EPISODE_BASE = 30_000_000
+MOVIE_BASE = 100_000
+
+# All synthetic items are added between these two timestamps
+ADDED_START = 1262304000  # 2010-01-01
+ADDED_END = 1735689600    # 2025-01-01
+
+class SyntheticLibrary:
+    """Deterministic fake movie and TV libraries plus their watch history.
+
+    Items are computed on demand from their index. Watch history is generated
+    up front (roughly `watched_ratio` of items get one to three plays across
+    a handful of accounts) and kept sorted by viewedAt, like Plex returns it.
+    Each play has a fixed id for its historyKey, so removing entries from
+    `history` doesn't renumber the rest.
+    """
+
+    def __init__(self, movies=1000, shows=50, seasons=5, episodes=10, watched_ratio=0.3, seed=1):
+        self.movies = movies
+        self.shows = shows
+        self.seasons = seasons
+        self.episodes = episodes
+        self.seed = seed
+        # episode ratingKey -> (updatedAt, size) of episodes whose file was replaced
+        self.replaced = {}
+
+        rng = random.Random(seed)
+        history_ids = itertools.count(1)
+        # (viewedAt, ratingKey, parentRatingKey, grandparentRatingKey, history id)
+        self.history = {MOVIE_SECTION: [], TV_SECTION: []}
+        for i in range(movies):
+            if rng.random() < watched_ratio:
+                for _ in range(rng.randint(1, 3)):
+                    self.history[MOVIE_SECTION].append((rng.randint(ADDED_START, ADDED_END), MOVIE_BASE + i, '', '',
+                                                        next(history_ids)))
+        for s in range(shows):
+            for n in range(seasons):
+                for e in range(episodes):
+                    if rng.random() < watched_ratio:
+                        for _ in range(rng.randint(1, 3)):
+                            self.history[TV_SECTION].append((
+                                rng.randint(ADDED_START, ADDED_END),
+                                self.episode_key(s, n, e), self.season_key(s, n), SHOW_BASE + s,
+                                next(history_ids)
+                            ))
+        for entries in self.history.values():
+            entries.sort()
+
+    def added_at(self, rating_key):
+        return ADDED_START + (rating_key * 2654435761) % (ADDED_END - ADDED_START)
+
+    def season_key(self, show, season):
+        return SEASON_BASE + show * 1000 + season
+
+    def episode_key(self, show, season, episode):
+        return EPISODE_BASE + (show * 1000 + season) * 1000 + episode
+
+    def replace_episode(self, show, season, episode, updated_at=None):
+        """Swap an episode's file the way Plex shows it: new size and updatedAt, season untouched"""
+        key = self.episode_key(show, season, episode)
+        self.replaced[key] = (updated_at or int(time.time()), 5_000_000_000 + key % 900_000_000)
+
+    def episode_updated_at(self, key):
+        return self.replaced[key][0] if key in self.replaced else self.added_at(key)
+
+    def updated_episodes(self, since):
+        """XML elements of every episode with updatedAt >= since, in listing order"""
+        return [self.episode_xml(s, n, e)
+                for s in range(self.shows) for n in range(self.seasons) for e in range(self.episodes)
+                if self.episode_updated_at(self.episode_key(s, n, e)) >= since]
+
+    def count(self, libtype):
+        return {
+            'movie': self.movies,
+            'show': self.shows,
+            'season': self.shows * self.seasons,
+            'episode': self.shows * self.seasons * self.episodes
+        }[libtype]
+
+    def movie_xml(self, i):
+        key = MOVIE_BASE + i
+        size = 1_000_000_000 + (key * 2654435761) % 40_000_000_000
+        return (f'<Video type="movie" ratingKey="{key}" key="/library/metadata/{key}" '
+                f'title={quoteattr(f"Movie {i}")} year="{1950 + i % 75}" librarySectionID="{MOVIE_SECTION}" '
+                f'addedAt="{self.added_at(key)}" updatedAt="{self.added_at(key)}"><Media id="{key}"><Part id="{key}" '
+                f'file="/media/movies/Movie {i}.mkv" size="{size}"/></Media></Video>')
+
+    def show_xml(self, s):
+        key = SHOW_BASE + s
+        return (f'<Directory type="show" ratingKey="{key}" key="/library/metadata/{key}/children" '
+                f'title={quoteattr(f"Show {s}")} childCount="{self.seasons}" leafCount="{self.seasons * self.episodes}" '
+                f'librarySectionID="{TV_SECTION}" addedAt="{self.added_at(key)}" updatedAt="{self.added_at(key)}"/>')
+
+    def season_xml(self, s, n):
+        key = self.season_key(s, n)
+        return (f'<Directory type="season" ratingKey="{key}" key="/library/metadata/{key}/children" '
+                f'parentRatingKey="{SHOW_BASE + s}" parentTitle={quoteattr(f"Show {s}")} index="{n + 1}" '
+                f'title="Season {n + 1}" year="{1990 + (s + n) % 35}" leafCount="{self.episodes}" '
+                f'librarySectionID="{TV_SECTION}" addedAt="{self.added_at(key)}" updatedAt="{self.added_at(key)}"/>')
+
+    def episode_xml(self, s, n, e):
+        key = self.episode_key(s, n, e)
+        updated_at, size = self.replaced.get(key, (self.added_at(key), 300_000_000 + key % 900_000_000))
+        return (f'<Video type="episode" ratingKey="{key}" key="/library/metadata/{key}" '
+                f'parentRatingKey="{self.season_key(s, n)}" grandparentRatingKey="{SHOW_BASE + s}" '
+                f'grandparentTitle={quoteattr(f"Show {s}")} parentIndex="{n + 1}" index="{e + 1}" '
+                f'title="Episode {e + 1}" librarySectionID="{TV_SECTION}" addedAt="{self.added_at(key)}" updatedAt="{updated_at}">'
+                f'<Media id="{key}"><Part id="{key}" file="/media/tv/Show {s}/S{n + 1:02d}E{e + 1:02d}.mkv" '
+                f'size="{size}"/></Media></Video>')
+
+    def listing(self, libtype, start, size):
+        """XML elements for items [start, start + size) of a section listing"""
+        stop = min(start + size, self.count(libtype))
+        for i in range(start, stop):
+            if libtype == 'movie':
+                yield self.movie_xml(i)
+            elif libtype == 'show':
+                yield self.show_xml(i)
+            elif libtype == 'season':
+                yield self.season_xml(*divmod(i, self.seasons))
+            else:
+                show_season, e = divmod(i, self.episodes)
+                yield self.episode_xml(*divmod(show_season, self.seasons), e)
+
+    def children(self, rating_key):
+        """XML elements for the seasons of a show or the episodes of a season"""
+        if SHOW_BASE <= rating_key < SEASON_BASE:
+            s = rating_key - SHOW_BASE
+            return [self.season_xml(s, n) for n in range(self.seasons)], 'Directory'
+        if SEASON_BASE <= rating_key < EPISODE_BASE:
+            s, n = divmod(rating_key - SEASON_BASE, 1000)
+            return [self.episode_xml(s, n, e) for e in range(self.episodes)], 'Video'
+        return [], None
+
+    def history_xml(self, entry):
+        viewed_at, rating_key, parent_key, grandparent_key, history_id = entry
+        return (f'<Video historyKey="/status/sessions/history/{history_id}" ratingKey="{rating_key}" '
+                f'parentRatingKey="{parent_key}" grandparentRatingKey="{grandparent_key}" '
+                f'accountID="{1 + rating_key % 4}" viewedAt="{viewed_at}"/>')
+
+class FakePlexHandler(BaseHTTPRequestHandler):
+    """Serves just enough of the Plex API for the report generators"""
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        if server.latency:
+            time.sleep(server.latency)
+
+        url = urlsplit(self.path)
+        query = {k: v[-1] for k, v in parse_qs(url.query, keep_blank_values=True).items()}
+        # Paging can arrive as headers (fetchItems) or query parameters (totalViewSize)
+        start = int(self.headers.get('X-Plex-Container-Start') or query.get('X-Plex-Container-Start') or 0)
+        size_value = self.headers.get('X-Plex-Container-Size') or query.get('X-Plex-Container-Size')
+        size = int(size_value) if size_value is not None else 100
+        parts = [p for p in url.path.split('/') if p]
+        library = server.library
+
+        if url.path == '/':
+            server.count('root')
+            return self.send_xml('', machineIdentifier=server.machine_identifier,
+                                 friendlyName='Benchmark Plex', version='1.40.0.0', size=0)
+        if url.path == '/library':
+            server.count('library')
+            return self.send_xml('', size=0, title1='Plex Library')
+        if url.path == '/library/sections':
+            server.count('sections')
+            body = (f'<Directory key="{MOVIE_SECTION}" type="movie" title="Benchmark Movies" agent="tv.plex.agents.movie" '
+                    f'uuid="bench-movies"/>'
+                    f'<Directory key="{TV_SECTION}" type="show" title="Benchmark TV" agent="tv.plex.agents.series" '
+                    f'uuid="bench-tv"/>')
+            return self.send_xml(body, size=2)
+        if len(parts) == 4 and parts[:2] == ['library', 'sections'] and parts[3] == 'all':
+            section_key = parts[2]
+            libtype = PLEX_TYPES.get(query.get('type'), 'movie' if section_key == MOVIE_SECTION else 'show')
+            server.count(f'listing:{libtype}')
+            if (section_key == MOVIE_SECTION) != (libtype == 'movie'):
+                return self.send_xml('', size=0, totalSize=0, librarySectionID=section_key)
+            if libtype == 'episode' and query.get('updatedAt>'):
+                items = library.updated_episodes(int(query['updatedAt>']))
+                return self.send_xml(''.join(items[start:start + size]), size=len(items[start:start + size]),
+                                     totalSize=len(items), offset=start, librarySectionID=section_key)
+            items = list(library.listing(libtype, start, size))
+            return self.send_xml(''.join(items), size=len(items), totalSize=library.count(libtype),
+                                 offset=start, librarySectionID=section_key)
+        if len(parts) == 4 and parts[:2] == ['library', 'metadata'] and parts[3] == 'children':
+            items, tag = library.children(int(parts[2]))
+            server.count('children:seasons' if tag == 'Directory' else 'children:episodes')
+            items = items[start:start + size]
+            return self.send_xml(''.join(items), size=len(items), totalSize=len(items))
+        if url.path == '/status/sessions/history/all':
+            server.count('history')
+            entries = library.history.get(query.get('librarySectionID'), [])
+            since = query.get('viewedAt>')
+            if since:
+                entries = [entry for entry in entries if entry[0] >= int(since)]
+            if query.get('sort') == 'viewedAt:desc':
+                entries = entries[::-1]
+            page = entries[start:start + size]
+            body = ''.join(library.history_xml(entry) for entry in page)
+            return self.send_xml(body, size=len(page), totalSize=len(entries))
+
+        server.count('not_found')
+        self.send_response(404)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def send_xml(self, body, **attrs):
+        attributes = ''.join(f' {name}={quoteattr(str(value))}' for name, value in attrs.items())
+        payload = f'<?xml version="1.0" encoding="UTF-8"?><MediaContainer{attributes}>{body}</MediaContainer>'.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/xml;charset=utf-8')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+class FakePlexServer(ThreadingHTTPServer):
+    """Local Plex stand-in serving a SyntheticLibrary, with per-request latency.
+
+    Use as a context manager; `url` is the base URL to hand to PlexServer and
+    `requests` counts requests per endpoint.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, library, latency=0.0, host='127.0.0.1', port=0):
+        super().__init__((host, port), FakePlexHandler)
+        self.library = library
+        self.latency = latency
+        self.machine_identifier = f'bench-{library.seed}'
+        self.requests = Counter()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def count(self, endpoint):
+        with self._lock:
+            self.requests[endpoint] += 1
+
+    def reset_counts(self):
+        with self._lock:
+            self.requests.clear()
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self.serve_forever, name='fake-plex', daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+        self.server_close()
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Run a fake Plex server with synthetic libraries')
+    parser.add_argument('--port', type=int, default=32400)
+    parser.add_argument('--movies', type=int, default=1000)
+    parser.add_argument('--shows', type=int, default=50)
+    parser.add_argument('--seasons', type=int, default=5)
+    parser.add_argument('--episodes', type=int, default=10)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every request')
+    args = parser.parse_args()
+
+    library = SyntheticLibrary(args.movies, args.shows, args.seasons, args.episodes)
+    with FakePlexServer(library, latency=args.latency, host='0.0.0.0', port=args.port) as server:
+        print(f'Fake Plex listening on {server.url} (any token is accepted)')
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
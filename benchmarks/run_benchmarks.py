@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Plex Unwatched Reporter - offline report benchmarks
+Copyright (C) 2025 Thad A. Williams
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published
+by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+Runs generate_movie_report_plexapi and generate_tv_report_plexapi against a
+local fake Plex server (see fake_plex.py) and reports wall time, requests
+sent to Plex, the Python heap peak (tracemalloc) and the process's peak
+resident set size for each scenario. The RSS peak covers the whole process
+and never goes down, so it only grows from one scenario to the next. No
+network or real Plex server needed:
+
+    python benchmarks/run_benchmarks.py --preset small --preset medium --latency 0.005
+"""
+
+import argparse
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app  # noqa: E402
+from plexapi.server import PlexServer  # noqa: E402
+from fake_plex import FakePlexServer, SyntheticLibrary, MOVIE_SECTION, TV_SECTION  # noqa: E402
+
+PRESETS = {
+    'small': dict(movies=1_000, shows=50, seasons=5, episodes=10),
+    'medium': dict(movies=10_000, shows=500, seasons=10, episodes=20),
+    'large': dict(movies=100_000, shows=500, seasons=10, episodes=20),
+}
+
+# name -> (section key, report kind, generator, extra generator kwargs)
+SCENARIOS = {
+    'movies': (MOVIE_SECTION, 'movie', app.generate_movie_report_plexapi, {}),
+    'tv-bulk': (TV_SECTION, 'tv', app.generate_tv_report_plexapi, {'bulk': True}),
+    'tv-walk': (TV_SECTION, 'tv', app.generate_tv_report_plexapi, {'bulk': False}),
+}
+
+def max_rss_mb():
+    """Peak resident set size of this process so far (ru_maxrss is KB on Linux, bytes on macOS)"""
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(max_rss / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+def run_scenario(server, name, workers, work_dir, history_cache, trace_memory, incremental=False):
+    """Generate one report against the fake server and measure it"""
+    section_key, kind, generator, kwargs = SCENARIOS[name]
+    if history_cache == 'cold':
+        for path in (app.HISTORY_DB_FILE, app.SNAPSHOT_DB_FILE):
+            if os.path.exists(path):
+                os.remove(path)
+
+    fetcher = app.PlexFetcher(workers)
+    try:
+        plex = PlexServer(server.url, 'benchmark', session=fetcher.session)
+        section = plex.library.sectionByID(int(section_key))
+        server.reset_counts()
+
+        output_path = os.path.join(work_dir, f'{name}.csv')
+        cutoff_date = datetime.now() - timedelta(days=30)
+        stale_cutoff = datetime.now() - timedelta(days=730)
+        progress_data = {}
+        # Warm incremental runs only rebuild rows that changed since the cold run
+        snapshot = app.SnapshotStore(app.SNAPSHOT_DB_FILE).open(section, kind) if incremental else None
+
+        if trace_memory:
+            tracemalloc.start()
+        started = time.perf_counter()
+        with app.collect_stats() as stats:
+            rows = generator(section, output_path, cutoff_date, stale_cutoff, progress_data, fetcher=fetcher,
+                             snapshot=snapshot, **kwargs)
+        if snapshot:
+            snapshot.save()
+        elapsed = time.perf_counter() - started
+        peak = tracemalloc.get_traced_memory()[1] if trace_memory else None
+        if trace_memory:
+            tracemalloc.stop()
+    finally:
+        fetcher.close()
+
+    return {
+        'scenario': name,
+        'history': history_cache,
+        'rows': rows,
+        'seconds': round(elapsed, 3),
+        'requests': sum(server.requests.values()),
+        'requestsByEndpoint': dict(server.requests),
+        'phases': {phase: round(seconds, 3) for phase, seconds in stats.phases.items()},
+        'pythonHeapPeakMB': round(peak / (1024 * 1024), 1) if peak is not None else None,
+        'maxRssMB': max_rss_mb()
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark report generation against a fake Plex server')
+    parser.add_argument('--preset', action='append', choices=sorted(PRESETS),
+                        help='library size preset (repeatable, default: small)')
+    parser.add_argument('--movies', type=int, help='custom movie count (overrides presets)')
+    parser.add_argument('--shows', type=int, default=500)
+    parser.add_argument('--seasons', type=int, default=10)
+    parser.add_argument('--episodes', type=int, default=20)
+    parser.add_argument('--scenario', action='append', choices=sorted(SCENARIOS),
+                        help='scenario to run (repeatable, default: all)')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every fake Plex request')
+    parser.add_argument('--workers', type=int, default=app.PLEX_WORKERS, help='concurrent Plex requests')
+    parser.add_argument('--incremental', action='store_true', help='keep a report snapshot between cold and warm runs')
+    parser.add_argument('--no-memory', action='store_true', help='skip tracemalloc (it slows runs down)')
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    args = parser.parse_args(argv)
+
+    if args.movies is not None:
+        sizes = {'custom': dict(movies=args.movies, shows=args.shows, seasons=args.seasons, episodes=args.episodes)}
+    else:
+        sizes = {name: PRESETS[name] for name in (args.preset or ['small'])}
+    scenarios = args.scenario or list(SCENARIOS)
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix='plex-report-bench-') as work_dir:
+        app.HISTORY_DB_FILE = os.path.join(work_dir, 'history.db')
+        app.SNAPSHOT_DB_FILE = os.path.join(work_dir, 'snapshots.db')
+        for preset, size in sizes.items():
+            library = SyntheticLibrary(**size)
+            with FakePlexServer(library, latency=args.latency) as server:
+                for name in scenarios:
+                    # First run downloads all history, the second only syncs
+                    for history_cache in ('cold', 'warm'):
+                        result = run_scenario(server, name, args.workers, work_dir, history_cache, not args.no_memory,
+                                              args.incremental)
+                        result.update(preset=preset, latency=args.latency, workers=args.workers, incremental=args.incremental)
+                        results.append(result)
+                        if not args.json:
+                            heap = result['pythonHeapPeakMB']
+                            heap = f"{heap:>8.1f}" if heap is not None else '       -'
+                            print(f"{preset:<8} {name:<8} {history_cache:<5} {result['rows']:>8} rows "
+                                  f"{result['seconds']:>9.3f}s {result['requests']:>7} requests "
+                                  f"{heap} MB Python heap peak {result['maxRssMB']:>8.1f} MB max RSS", flush=True)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
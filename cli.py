@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+"""
+Plex Unwatched Reporter - headless report runner
+Copyright (C) 2025 Thad A. Williams
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published
+by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program. If not, see <https://www.gnu.org/licenses/>.
+
+Generates reports without the web UI, for cron and other schedulers. Plex
+servers come from "servers" in config.json (or PLEX_URL/PLEX_TOKEN and the
+libraries selected in the UI when there is none) and each one runs in its
+own worker process:
+
+    python cli.py                      # every configured server
+    python cli.py --server home --json
+
+Flask, plexapi and the report engine are only imported inside the workers,
+so argument and config errors come back immediately. Exit status: 0 when
+every report was written, 1 when any server failed, 2 for usage or config
+errors, 130 when interrupted.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import signal
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from urllib.parse import urlsplit
+
+DEFAULT_CONFIG_FILE = '/config/config.json'
+DEFAULT_REPORTS_DIR = '/reports'
+
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_USAGE = 2
+EXIT_INTERRUPTED = 130
+
+# Per-server keys passed straight to the report engine (same names as the /api/generate request)
+RUN_OPTIONS = ('excludeDays', 'staleDays', 'exportFormats', 'parallelLibraries', 'incremental', 'deltaReport',
+               'fullResync')
+
+class ConfigError(Exception):
+    """config.json or the command line doesn't describe a runnable set of servers"""
+
+class Cancelled(Exception):
+    """A server's run was stopped by SIGTERM or the parent being interrupted"""
+
+def load_servers(config):
+    """Server definitions from config.json.
+
+    Each entry of "servers" needs a url and token (token falls back to
+    PLEX_TOKEN); name defaults to the server's host, libraries (keys or
+    titles) to every movie and TV library, and reportsDir to a folder named
+    after the server. Any of RUN_OPTIONS overrides the top-level setting for
+    that server. Without "servers", the app's own PLEX_URL/PLEX_TOKEN and
+    the libraries selected in the UI are used.
+    """
+    entries = config.get('servers')
+    if entries is None:
+        if not os.environ.get('PLEX_URL') or not os.environ.get('PLEX_TOKEN'):
+            raise ConfigError('No "servers" in config.json and PLEX_URL/PLEX_TOKEN are not set')
+        selected = [key for key, on in config.get('selectedLibraries', {}).items() if on]
+        if not selected:
+            raise ConfigError('No libraries selected - pick some in the web UI or add "servers" to config.json')
+        return [{'name': 'default', 'url': os.environ['PLEX_URL'], 'token': os.environ['PLEX_TOKEN'],
+                 'libraries': selected, 'libraryTypes': config.get('libraryTypes', {}), 'reportsDir': None}]
+
+    if not isinstance(entries, list) or not entries:
+        raise ConfigError('"servers" in config.json must be a non-empty list')
+    servers = []
+    for position, entry in enumerate(entries, start=1):
+        if not isinstance(entry, dict) or not entry.get('url'):
+            raise ConfigError(f'Server #{position} in config.json has no "url"')
+        token = entry.get('token') or os.environ.get('PLEX_TOKEN')
+        if not token:
+            raise ConfigError(f'Server #{position} in config.json has no "token"')
+        name = str(entry.get('name') or urlsplit(entry['url']).hostname or f'server{position}')
+        if name in (server['name'] for server in servers):
+            raise ConfigError(f'Server name "{name}" is used twice in config.json')
+        server = {'name': name, 'url': entry['url'], 'token': token,
+                  'libraries': [str(lib) for lib in entry.get('libraries', [])],
+                  'libraryTypes': entry.get('libraryTypes', {}), 'reportsDir': entry.get('reportsDir', name)}
+        server.update((key, entry[key]) for key in RUN_OPTIONS if key in entry)
+        servers.append(server)
+    return servers
+
+def pick_libraries(available, wanted, types):
+    """Library keys in Plex order plus their report type, from keys or titles.
+
+    With nothing wanted, every movie and TV library is picked.
+    """
+    available = [dict(lib, key=str(lib['key'])) for lib in available]
+    by_name = {}
+    for lib in available:
+        by_name[lib['key']] = lib
+        by_name.setdefault(lib['title'].casefold(), lib)
+    if wanted:
+        picked = []
+        for name in wanted:
+            lib = by_name.get(name) or by_name.get(name.casefold())
+            if lib is None:
+                raise ValueError(f'Library not found: {name}')
+            picked.append(lib)
+    else:
+        picked = [lib for lib in available if lib['type'] in ('movie', 'show')]
+    keys = [lib['key'] for lib in available if lib in picked]
+    library_types = {}
+    for lib in picked:
+        lib_type = types.get(lib['key']) or types.get(lib['title'])
+        library_types[lib['key']] = lib_type or ('tv' if lib['type'] == 'show' else 'movie')
+    return keys, library_types
+
+def run_server(server, options):
+    """Generate one server's reports - runs in a worker process, where the heavy imports happen"""
+    started = time.perf_counter()
+    outcome = {'server': server['name'], 'url': server['url'], 'reports': []}
+    try:
+        import threading
+        import app
+
+        app.CONFIG_FILE = options['config']
+        app.HISTORY_DB_FILE = os.path.join(options['dataDir'], 'history.db')
+        app.SNAPSHOT_DB_FILE = os.path.join(options['dataDir'], 'snapshots.db')
+        app.REPORTS_DIR = os.path.join(options['reportsDir'], server['reportsDir'] or '')
+        app.PLEX_URL = server['url']
+        app.PLEX_TOKEN = server['token']
+
+        keys, library_types = pick_libraries(app.plex_connections.libraries(refresh=True),
+                                             server['libraries'], server['libraryTypes'])
+        if not keys:
+            raise ValueError('No movie or TV libraries to report on')
+        data = {key: server[key] for key in RUN_OPTIONS if key in server}
+        data.update(options['overrides'])
+        data.update({'selectedLibraries': {key: True for key in keys}, 'libraryTypes': library_types,
+                     'librariesOrder': keys})
+
+        # SIGTERM (e.g. a scheduler timeout) cancels the run at the next progress update,
+        # and so does the parent's cancel event when several servers run in worker processes
+        cancel_event = threading.Event()
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGTERM, lambda signum, frame: cancel_event.set())
+        if options.get('cancel') is not None:
+            threading.Thread(target=forward_cancel, args=(options['cancel'], cancel_event), daemon=True,
+                             name='cancel-forward').start()
+        try:
+            result = app.run_reports(data, app.JobProgress(cancel_event))
+        except app.JobCancelled:
+            raise Cancelled('Cancelled') from None
+        finally:
+            app.plex_connections.invalidate()
+
+        outcome['reports'] = [{
+            'library': report['library'],
+            'type': library_types[key],
+            'items': report['itemCount'],
+            'seconds': report['metrics']['seconds'],
+            'itemsPerSecond': report['metrics']['itemsPerSecond'],
+            'file': os.path.join(app.REPORTS_DIR, report['filename']),
+            'exports': [os.path.join(app.REPORTS_DIR, export['filename']) for export in report.get('exports', [])],
+            'phases': report['metrics']['phases']
+        } for key, report in zip(keys, result['reports'])]
+        outcome['summary'] = os.path.join(app.REPORTS_DIR, result['summary']['filename'])
+        outcome['reclaimableBytes'] = result['summary']['totals']['reclaimableBytes']
+        outcome['status'] = 'ok'
+    except Cancelled as e:
+        outcome['status'] = 'cancelled'
+        outcome['error'] = str(e)
+    except Exception as e:
+        outcome['status'] = 'failed'
+        outcome['error'] = f'{type(e).__name__}: {e}'
+    outcome['seconds'] = round(time.perf_counter() - started, 3)
+    return outcome
+
+def forward_cancel(remote_event, cancel_event):
+    """Set a worker's cancel event once the parent's (a Manager Event) is set"""
+    try:
+        remote_event.wait()
+    except (EOFError, OSError):
+        # The parent's manager is gone - the pool is shutting down anyway
+        return
+    cancel_event.set()
+
+def ignore_interrupts():
+    """Worker initializer - Ctrl+C reaches the whole process group, but only the parent should
+    handle it (by setting the shared cancel event)"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+def raise_interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+def run_pool(servers, options, processes, on_outcome):
+    """Run servers in worker processes, outcomes in server order.
+
+    SIGTERM or Ctrl+C sets a cancel event the workers watch, so running
+    servers stop at their next progress update and queued ones never start;
+    KeyboardInterrupt is re-raised once they have all unwound. A worker that
+    dies (BrokenProcessPool) fails its server instead of the whole run.
+    """
+    outcomes = {}
+    started = time.perf_counter()
+    with multiprocessing.Manager() as manager, \
+            ProcessPoolExecutor(max_workers=processes, initializer=ignore_interrupts) as pool:
+        options = dict(options, cancel=manager.Event())
+        futures = {pool.submit(run_server, server, options): server for server in servers}
+        try:
+            for future in as_completed(futures):
+                server = futures[future]
+                try:
+                    outcome = future.result()
+                except BrokenProcessPool as e:
+                    outcome = {'server': server['name'], 'url': server['url'], 'reports': [], 'status': 'failed',
+                               'error': f'BrokenProcessPool: {e}',
+                               'seconds': round(time.perf_counter() - started, 3)}
+                outcomes[server['name']] = outcome
+                on_outcome(outcome)
+        except KeyboardInterrupt:
+            options['cancel'].set()
+            pool.shutdown(wait=True, cancel_futures=True)
+            raise
+    return [outcomes[server['name']] for server in servers]
+
+def print_outcome(outcome):
+    """Per-library timing lines for one server"""
+    for report in outcome['reports']:
+        print(f"{outcome['server']:<12} {report['library'][:28]:<28} {report['type']:<5} {report['items']:>8} items "
+              f"{report['seconds']:>9.2f}s {report['itemsPerSecond'] or 0:>9.1f}/s  {report['file']}", flush=True)
+    if outcome['status'] == 'ok':
+        print(f"{outcome['server']:<12} {'done':<28} {'':<5} {sum(r['items'] for r in outcome['reports']):>8} items "
+              f"{outcome['seconds']:>9.2f}s  {outcome['summary']}", flush=True)
+    else:
+        print(f"{outcome['server']:<12} {outcome['status'].upper()} after {outcome['seconds']:.2f}s - {outcome['error']}",
+              file=sys.stderr, flush=True)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Generate Plex unwatched reports without the web UI')
+    parser.add_argument('--config', default=os.environ.get('CONFIG_FILE', DEFAULT_CONFIG_FILE),
+                        help='config.json with settings and "servers" (default: %(default)s)')
+    parser.add_argument('--data-dir', help='where history.db and snapshots.db live (default: next to the config)')
+    parser.add_argument('--reports-dir', default=os.environ.get('REPORTS_DIR', DEFAULT_REPORTS_DIR),
+                        help='where reports are written (default: %(default)s)')
+    parser.add_argument('--server', action='append', help='only run this server (by name, repeatable)')
+    parser.add_argument('--processes', type=int, help='servers run at the same time (default: all of them)')
+    parser.add_argument('--format', action='append', dest='formats', help='export format besides CSV (repeatable)')
+    parser.add_argument('--full-resync', action='store_true', help='re-download all history and rebuild every row')
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    args = parser.parse_args(argv)
+
+    try:
+        config = {}
+        if os.path.exists(args.config):
+            with open(args.config) as f:
+                config = json.load(f)
+        servers = load_servers(config)
+        if args.server:
+            unknown = set(args.server) - {server['name'] for server in servers}
+            if unknown:
+                raise ConfigError(f"Unknown server: {', '.join(sorted(unknown))}")
+            servers = [server for server in servers if server['name'] in args.server]
+    except (OSError, ValueError, ConfigError) as e:
+        print(f'error: {e}', file=sys.stderr)
+        return EXIT_USAGE
+
+    overrides = {}
+    if args.formats:
+        overrides['exportFormats'] = args.formats
+    if args.full_resync:
+        overrides['fullResync'] = True
+    options = {'config': os.path.abspath(args.config),
+               'dataDir': os.path.abspath(args.data_dir or os.path.dirname(os.path.abspath(args.config))),
+               'reportsDir': os.path.abspath(args.reports_dir), 'overrides': overrides}
+
+    processes = max(1, min(args.processes or len(servers), len(servers)))
+    on_outcome = (lambda outcome: None) if args.json else print_outcome
+    previous_handler = None
+    try:
+        if processes == 1 and len(servers) == 1:
+            outcomes = [run_server(servers[0], options)]
+            on_outcome(outcomes[0])
+        else:
+            # One process per server: separate connections, GILs and report engines. SIGTERM
+            # interrupts the parent like Ctrl+C, which then cancels the workers
+            if hasattr(signal, 'SIGTERM'):
+                previous_handler = signal.signal(signal.SIGTERM, raise_interrupt)
+            outcomes = run_pool(servers, options, processes, on_outcome)
+    except KeyboardInterrupt:
+        print('Interrupted', file=sys.stderr)
+        return EXIT_INTERRUPTED
+    finally:
+        if previous_handler is not None:
+            signal.signal(signal.SIGTERM, previous_handler)
+
+    if args.json:
+        print(json.dumps({'servers': outcomes}, indent=2))
+    if any(outcome['status'] == 'cancelled' for outcome in outcomes):
+        return EXIT_INTERRUPTED
+    return EXIT_OK if all(outcome['status'] == 'ok' for outcome in outcomes) else EXIT_FAILED
+
+if __name__ == '__main__':
+    sys.exit(main())
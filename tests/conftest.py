@@ -0,0 +1,34 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, 'benchmarks')]
+
+import app  # noqa: E402
+from fake_plex import FakePlexServer, SyntheticLibrary  # noqa: E402
+
+@pytest.fixture
+def app_dirs(tmp_path, monkeypatch):
+    """Point the app's config, databases and reports folder at a temp dir"""
+    reports = tmp_path / 'reports'
+    reports.mkdir()
+    monkeypatch.setattr(app, 'CONFIG_FILE', str(tmp_path / 'config.json'))
+    monkeypatch.setattr(app, 'HISTORY_DB_FILE', str(tmp_path / 'history.db'))
+    monkeypatch.setattr(app, 'SNAPSHOT_DB_FILE', str(tmp_path / 'snapshots.db'))
+    monkeypatch.setattr(app, 'REPORTS_DIR', str(reports))
+    return tmp_path
+
+@pytest.fixture
+def library():
+    return SyntheticLibrary(movies=200, shows=8, seasons=3, episodes=4)
+
+@pytest.fixture
+def plex_server(library, app_dirs, monkeypatch):
+    """Fake Plex server the app is pointed at"""
+    with FakePlexServer(library) as server:
+        monkeypatch.setattr(app, 'PLEX_URL', server.url)
+        monkeypatch.setattr(app, 'PLEX_TOKEN', 'test')
+        yield server
+        app.plex_connections.invalidate()
@@ -0,0 +1,67 @@
+import json
+import os
+import signal
+
+import pytest
+
+import app
+import cli
+
+DEAD_URL = 'http://127.0.0.1:9'
+
+@pytest.fixture
+def run(app_dirs, monkeypatch):
+    """cli.main with --config/--data-dir/--reports-dir in the temp dir, config given as a dict"""
+    # A single server runs in this process, where run_server repoints the app and sets a SIGTERM handler
+    for name in ('CONFIG_FILE', 'HISTORY_DB_FILE', 'SNAPSHOT_DB_FILE', 'REPORTS_DIR', 'PLEX_URL', 'PLEX_TOKEN'):
+        monkeypatch.setattr(app, name, getattr(app, name))
+    previous_handler = signal.getsignal(signal.SIGTERM)
+    config_path = app_dirs / 'cli-config.json'
+
+    def run(config, *args):
+        config_path.write_text(json.dumps(config))
+        return cli.main(['--config', str(config_path), '--data-dir', str(app_dirs),
+                         '--reports-dir', str(app_dirs / 'out'), '--json', *args])
+
+    yield run
+    signal.signal(signal.SIGTERM, previous_handler)
+    app.plex_connections.invalidate()
+
+def server(name, url):
+    return {'name': name, 'url': url, 'token': 'test'}
+
+def test_ok(run, plex_server, app_dirs, capsys):
+    assert run({'servers': [server('home', plex_server.url)]}) == cli.EXIT_OK
+    outcome, = json.loads(capsys.readouterr().out)['servers']
+    assert outcome['status'] == 'ok'
+    assert [report['type'] for report in outcome['reports']] == ['movie', 'tv']
+    assert all(os.path.isfile(report['file']) for report in outcome['reports'])
+    assert os.path.dirname(outcome['summary']) == str(app_dirs / 'out' / 'home')
+
+def test_one_failed_server(run, plex_server, capsys):
+    config = {'servers': [server('home', plex_server.url), server('gone', DEAD_URL)]}
+    assert run(config) == cli.EXIT_FAILED
+    outcomes = {outcome['server']: outcome for outcome in json.loads(capsys.readouterr().out)['servers']}
+    assert outcomes['home']['status'] == 'ok'
+    assert outcomes['gone']['status'] == 'failed'
+
+def test_only_selected_server_runs(run, plex_server, capsys):
+    config = {'servers': [server('home', plex_server.url), server('gone', DEAD_URL)]}
+    assert run(config, '--server', 'home') == cli.EXIT_OK
+    assert [outcome['server'] for outcome in json.loads(capsys.readouterr().out)['servers']] == ['home']
+
+@pytest.mark.parametrize('config, args', [
+    ({'servers': [server('home', DEAD_URL)]}, ['--server', 'cabin']),
+    ({'servers': []}, []),
+    ({'servers': [{'name': 'home', 'token': 'test'}]}, []),
+    ({'servers': [server('home', DEAD_URL), server('home', DEAD_URL)]}, []),
+])
+def test_usage_errors(run, capsys, config, args):
+    assert run(config, *args) == cli.EXIT_USAGE
+    assert capsys.readouterr().err.startswith('error: ')
+
+def test_unreadable_config(run, app_dirs, capsys):
+    config_path = app_dirs / 'broken.json'
+    config_path.write_text('{"servers": [')
+    assert cli.main(['--config', str(config_path)]) == cli.EXIT_USAGE
+    assert capsys.readouterr().err.startswith('error: ')
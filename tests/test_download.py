@@ -0,0 +1,64 @@
+import gzip
+import os
+
+import pytest
+
+import app
+
+CONTENT = ''.join(f'Movie {i},{2000 + i % 20},Never Watched\n' for i in range(500)).encode()
+
+@pytest.fixture
+def client(app_dirs):
+    with open(os.path.join(app.REPORTS_DIR, 'movies.csv'), 'wb') as f:
+        f.write(CONTENT)
+    return app.app.test_client()
+
+def test_full_download(client):
+    response = client.get('/api/download/movies.csv')
+    assert response.status_code == 200
+    assert response.data == CONTENT
+    assert 'Content-Encoding' not in response.headers
+    assert 'Accept-Encoding' in response.vary
+    assert response.headers['Accept-Ranges'] == 'bytes'
+
+def test_range_request(client):
+    response = client.get('/api/download/movies.csv', headers={'Range': 'bytes=0-9'})
+    assert response.status_code == 206
+    assert response.data == CONTENT[:10]
+    assert response.headers['Content-Range'] == f'bytes 0-9/{len(CONTENT)}'
+
+def test_if_none_match(client):
+    etag = client.get('/api/download/movies.csv').headers['ETag']
+    response = client.get('/api/download/movies.csv', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.data == b''
+
+def test_gzip_has_its_own_etag(client):
+    identity = client.get('/api/download/movies.csv')
+    encoded = client.get('/api/download/movies.csv', headers={'Accept-Encoding': 'gzip'})
+    assert encoded.status_code == 200
+    assert encoded.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(encoded.data) == CONTENT
+    assert encoded.headers['ETag'] != identity.headers['ETag']
+
+    # Revalidating each representation only matches its own ETag
+    assert client.get('/api/download/movies.csv', headers={
+        'Accept-Encoding': 'gzip', 'If-None-Match': encoded.headers['ETag']}).status_code == 304
+    assert client.get('/api/download/movies.csv', headers={
+        'Accept-Encoding': 'gzip', 'If-None-Match': identity.headers['ETag']}).status_code == 200
+
+def test_gzip_copy_rebuilt_when_report_changes(client):
+    client.get('/api/download/movies.csv', headers={'Accept-Encoding': 'gzip'})
+    path = os.path.join(app.REPORTS_DIR, 'movies.csv')
+    with open(path, 'ab') as f:
+        f.write(b'Extra,2024,Stale\n')
+    # Make sure the report is newer than its .gz copy even on coarse mtimes
+    stat = os.stat(path + '.gz')
+    os.utime(path, (stat.st_atime, stat.st_mtime + 5))
+
+    response = client.get('/api/download/movies.csv', headers={'Accept-Encoding': 'gzip'})
+    assert gzip.decompress(response.data) == CONTENT + b'Extra,2024,Stale\n'
+
+def test_missing_and_unsafe_names(client):
+    assert client.get('/api/download/nope.csv').status_code == 404
+    assert client.get('/api/download/..%2Fconfig.json').status_code == 404
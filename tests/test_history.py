@@ -0,0 +1,88 @@
+import threading
+import time
+
+import pytest
+
+import app
+from fake_plex import MOVIE_BASE, MOVIE_SECTION
+from plexapi.server import PlexServer
+
+def sync(server, store):
+    plex = PlexServer(server.url, 'test')
+    return plex, store.sync(plex, MOVIE_SECTION)
+
+def spy_history(monkeypatch):
+    """Record every history entry the sync downloads"""
+    seen = []
+    original = app.iter_section_history
+
+    def iter_section_history(*args, **kwargs):
+        for entry in original(*args, **kwargs):
+            seen.append(entry)
+            yield entry
+
+    monkeypatch.setattr(app, 'iter_section_history', iter_section_history)
+    return seen
+
+def test_second_sync_fetches_only_new_plays(plex_server, library, monkeypatch):
+    store = app.HistoryStore(app.HISTORY_DB_FILE)
+    plex, stats = sync(plex_server, store)
+    entries = library.history[MOVIE_SECTION]
+    assert stats['added'] == len(entries) and not stats['fullResync']
+
+    # Plays at the high-water mark are asked for again and de-duplicated by historyKey
+    high_water = max(entry[0] for entry in entries)
+    overlap = {f'/status/sessions/history/{entry[4]}' for entry in entries if entry[0] == high_water}
+    now = int(time.time())
+    entries += [(now, MOVIE_BASE + 1, '', '', 10 ** 6), (now + 1, MOVIE_BASE + 2, '', '', 10 ** 6 + 1)]
+    seen = spy_history(monkeypatch)
+    _, stats = sync(plex_server, store)
+
+    assert stats == {'added': 2, 'fullResync': False, 'requests': stats['requests']}
+    assert {entry['historyKey'] for entry in seen} == overlap | {'/status/sessions/history/1000000',
+                                                                 '/status/sessions/history/1000001'}
+    assert store.count(plex.machineIdentifier, MOVIE_SECTION) == len(entries)
+
+def test_deleted_play_triggers_full_resync(plex_server, library):
+    store = app.HistoryStore(app.HISTORY_DB_FILE)
+    sync(plex_server, store)
+    entries = library.history[MOVIE_SECTION]
+    del entries[len(entries) // 2]
+
+    plex, stats = sync(plex_server, store)
+
+    assert stats['fullResync']
+    assert store.count(plex.machineIdentifier, MOVIE_SECTION) == len(entries)
+    index = store.load_index(plex.machineIdentifier, MOVIE_SECTION)
+    assert sum(index.play_count(str(key)) for key in range(MOVIE_BASE, MOVIE_BASE + library.movies)) == len(entries)
+
+def test_sync_in_small_batches(plex_server, library, monkeypatch):
+    monkeypatch.setattr(app, 'HISTORY_BATCH_ROWS', 7)
+    store = app.HistoryStore(app.HISTORY_DB_FILE)
+    plex, stats = sync(plex_server, store)
+    entries = library.history[MOVIE_SECTION]
+    assert stats['added'] == len(entries) and not stats['fullResync']
+    assert store.high_water(plex.machineIdentifier, MOVIE_SECTION) == max(entry[0] for entry in entries)
+
+def test_cancelled_sync_keeps_high_water(plex_server, library, monkeypatch):
+    monkeypatch.setattr(app, 'HISTORY_BATCH_ROWS', 7)
+    store = app.HistoryStore(app.HISTORY_DB_FILE)
+    original = app.iter_section_history
+    cancel = threading.Event()
+
+    def cancel_after_download(*args, **kwargs):
+        yield from original(*args, **kwargs)
+        cancel.set()
+
+    monkeypatch.setattr(app, 'iter_section_history', cancel_after_download)
+    plex = PlexServer(plex_server.url, 'test')
+    with app.cancellable(cancel), pytest.raises(app.JobCancelled):
+        store.sync(plex, MOVIE_SECTION)
+    assert store.high_water(plex.machineIdentifier, MOVIE_SECTION) == 0
+    assert store.count(plex.machineIdentifier, MOVIE_SECTION) == len(library.history[MOVIE_SECTION])
+
+    # The next sync starts over and de-duplicates what the cancelled one wrote
+    monkeypatch.setattr(app, 'iter_section_history', original)
+    _, stats = sync(plex_server, store)
+    assert stats['added'] == 0 and not stats['fullResync']
+    assert store.count(plex.machineIdentifier, MOVIE_SECTION) == len(library.history[MOVIE_SECTION])
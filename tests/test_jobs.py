@@ -0,0 +1,111 @@
+import sqlite3
+import threading
+
+import pytest
+
+import app
+
+@pytest.fixture
+def jobs(monkeypatch):
+    """Fresh JobManager behind the /api routes, one job at a time"""
+    manager = app.JobManager(max_concurrent=1, retention=3)
+    monkeypatch.setattr(app, 'jobs', manager)
+    yield manager
+    manager._executor.shutdown(wait=True)
+
+@pytest.fixture
+def client():
+    return app.app.test_client()
+
+def blocker():
+    """Job function that runs until released, plus the release event"""
+    release = threading.Event()
+
+    def run(params, progress):
+        assert release.wait(10)
+        return params
+    return run, release
+
+def generate(client, **data):
+    body = dict({'selectedLibraries': {'1': True, '2': True}, 'librariesOrder': ['1', '2'],
+                 'libraryTypes': {'1': 'movie', '2': 'tv'}, 'wait': True}, **data)
+    return client.post('/api/generate', json=body)
+
+def snapshot_rows(section_id):
+    with sqlite3.connect(app.SNAPSHOT_DB_FILE) as db:
+        state = db.execute('SELECT generation FROM snapshot_state WHERE section_id=?', (section_id,)).fetchone()
+        generations = {row[0] for row in db.execute(
+            'SELECT DISTINCT generation FROM snapshot_items WHERE section_id=?', (section_id,))}
+    return state[0] if state else None, generations
+
+def test_queued_job_cancelled_before_it_starts(jobs):
+    run, release = blocker()
+    running = jobs.submit(run, {'job': 1})
+    queued = jobs.submit(run, {'job': 2})
+    assert queued.status == 'queued'
+
+    assert jobs.cancel(queued.id).status == 'cancelled'
+    release.set()
+    running.future.result(timeout=10)
+    assert running.status == 'completed' and running.result == {'job': 1}
+    assert queued.status == 'cancelled' and queued.started is None and queued.finished is not None
+
+def test_job_cancelled_during_history_sync(jobs, client, plex_server, monkeypatch):
+    assert generate(client).status_code == 200
+    previous = [snapshot_rows('1'), snapshot_rows('2')]
+    assert all(state is not None and generations == {state} for state, generations in previous)
+
+    original = app.iter_section_history
+    discard = app.ReportSnapshot.discard
+    discarded = []
+
+    def spy_discard(snapshot):
+        discarded.append(snapshot.section_id)
+        discard(snapshot)
+
+    def cancel_mid_sync(*args, **kwargs):
+        for number, entry in enumerate(original(*args, **kwargs)):
+            if number == 1:
+                jobs.cancel(jobs.latest().id)
+            yield entry
+
+    monkeypatch.setattr(app, 'iter_section_history', cancel_mid_sync)
+    monkeypatch.setattr(app.ReportSnapshot, 'discard', spy_discard)
+    # A full resync downloads the whole history again, so there is a second entry to cancel at
+    response = generate(client, fullResync=True)
+
+    assert response.status_code == 500
+    job = jobs.get(response.get_json()['jobId'])
+    assert job.status == 'cancelled' and job.error is None
+    # The cancelled run's snapshot is dropped and the last complete one is still current
+    assert discarded and set(discarded) <= {'1', '2'}
+    assert [snapshot_rows('1'), snapshot_rows('2')] == previous
+
+def test_prune_keeps_running_jobs(jobs):
+    manager = app.JobManager(max_concurrent=2, retention=2)
+    run, release = blocker()
+    running = manager.submit(run, {})
+    try:
+        finished = []
+        for number in range(5):
+            job = manager.submit(lambda params, progress: params, {'job': number})
+            job.future.result(timeout=10)
+            finished.append(job)
+        with manager._lock:
+            manager._prune()
+
+        kept = manager.list()
+        assert running in kept and running.status == 'running'
+        assert len([job for job in kept if job.done]) == manager.retention
+        # Oldest finished jobs go first
+        assert finished[0] not in kept and finished[-1] in kept
+    finally:
+        release.set()
+        manager._executor.shutdown(wait=True)
+
+def test_progress_of_unknown_job(jobs, client):
+    response = client.get('/api/progress/nope')
+    assert response.status_code == 404
+    assert response.get_json() == {'error': 'Job not found'}
+    assert client.get('/api/progress').status_code == 404
+    assert client.post('/api/jobs/nope/cancel').status_code == 404
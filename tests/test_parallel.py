@@ -0,0 +1,83 @@
+import threading
+
+import pytest
+
+import app
+
+@pytest.fixture
+def run(plex_server):
+    """run_reports over the fake server's movie ('1') and TV ('2') libraries, two at a time"""
+    def run(order=('1', '2'), **data):
+        progress = app.JobProgress(threading.Event())
+        data = dict({'selectedLibraries': {key: True for key in order}, 'librariesOrder': list(order),
+                     'libraryTypes': {'1': 'movie', '2': 'tv'}, 'parallelLibraries': 2}, **data)
+        try:
+            return app.run_reports(data, progress), progress
+        except Exception as e:
+            return e, progress
+    return run
+
+def test_results_in_library_order_when_second_finishes_first(run, monkeypatch):
+    tv_done = threading.Event()
+    movie_report = app.generate_movie_report_plexapi
+    tv_report = app.generate_tv_report_plexapi
+
+    def slow_movie_report(*args, **kwargs):
+        assert tv_done.wait(10)
+        return movie_report(*args, **kwargs)
+
+    def tv_report_then_signal(*args, **kwargs):
+        try:
+            return tv_report(*args, **kwargs)
+        finally:
+            tv_done.set()
+
+    monkeypatch.setattr(app, 'generate_movie_report_plexapi', slow_movie_report)
+    monkeypatch.setattr(app, 'generate_tv_report_plexapi', tv_report_then_signal)
+    result, progress = run()
+
+    assert [report['library'] for report in result['reports']] == ['Benchmark Movies', 'Benchmark TV']
+    assert result['summary']['libraries'] == ['Benchmark Movies', 'Benchmark TV']
+    assert (progress['current'], progress['libraries_done'], progress['total']) == (2, 2, 2)
+    assert {lib['status'] for lib in progress['libraries'].values()} == {'done'}
+
+def test_failing_library_stops_the_other(run, monkeypatch):
+    movie_report = app.generate_movie_report_plexapi
+    section = app.PlexConnection.section
+    movie_started = threading.Event()
+    finished = []
+
+    def movie_report_after_failure(section, output_path, cutoff, stale, progress_data, **kwargs):
+        # Carry on only once the other library has failed, so the job's cancel is what stops this one
+        movie_started.set()
+        assert progress_data._job_progress.cancel_event.wait(10)
+        count = movie_report(section, output_path, cutoff, stale, progress_data, **kwargs)
+        finished.append(count)
+        return count
+
+    def section_once_movie_started(conn, key):
+        if str(key) == '99':
+            assert movie_started.wait(10)
+        return section(conn, key)
+
+    monkeypatch.setattr(app, 'generate_movie_report_plexapi', movie_report_after_failure)
+    monkeypatch.setattr(app.PlexConnection, 'section', section_once_movie_started)
+    error, progress = run(order=('1', '99'))
+
+    assert isinstance(error, app.NotFound) and str(error) == 'Invalid library sectionID: 99'
+    assert finished == []
+    assert progress['libraries']['99']['status'] == 'failed'
+    assert progress['libraries']['1']['status'] == 'running'
+    assert (progress['current'], progress['libraries_done']) == (1, 0)
+
+def test_failed_job_reports_the_library_error(plex_server, monkeypatch):
+    manager = app.JobManager()
+    monkeypatch.setattr(app, 'jobs', manager)
+    response = app.app.test_client().post('/api/generate', json={
+        'selectedLibraries': {'1': True, '99': True}, 'librariesOrder': ['1', '99'], 'parallelLibraries': 2,
+        'wait': True})
+    manager._executor.shutdown(wait=True)
+
+    assert response.status_code == 500
+    assert response.get_json()['error'] == 'Invalid library sectionID: 99'
+    assert manager.get(response.get_json()['jobId']).status == 'failed'
@@ -0,0 +1,89 @@
+import random
+from datetime import datetime
+
+import pytest
+
+import app
+
+STATUSES = ('Never Watched', 'Stale', 'Recently Watched')
+
+@pytest.fixture
+def table(monkeypatch):
+    """Movie table with repeated values and some missing play dates, kept in the report store"""
+    monkeypatch.setattr(app, 'report_store', app.ReportStore())
+    rng = random.Random(3)
+    table = app.ReportTable('movie', 'Movies')
+    for i in range(60):
+        watched = datetime(2024, 1, 1 + i % 28) if i % 4 else None
+        table.append((f'Movie {i:02d}', 1990 + i % 7, datetime(2023, 1, 1 + i % 28), i % 5, watched,
+                      rng.choice(STATUSES), f'/movies/{i}.mkv', rng.choice((100, 200, 300)), 0))
+    app.report_store.add(table.finish())
+    return table
+
+@pytest.fixture
+def client():
+    return app.app.test_client()
+
+def rows_where(table, keep):
+    return [row_id for row_id in range(len(table)) if keep(table.row(row_id))]
+
+def test_equals_and_range_filters(table):
+    row_ids, _ = table.query(equals=[('status', ['Stale', 'Never Watched'])], ranges=[('fileSize', 150, None)])
+    assert list(row_ids) == rows_where(table, lambda row: row['status'] in ('Stale', 'Never Watched')
+                                       and row['fileSize'] >= 150)
+
+def test_range_never_matches_missing_values(table):
+    low = int(datetime(2000, 1, 1).timestamp())
+    row_ids, _ = table.query(ranges=[('lastWatched', low, None)])
+    assert list(row_ids) == rows_where(table, lambda row: row['lastWatched'] is not None)
+
+def test_descending_sort_keeps_report_order_and_puts_missing_last(table):
+    row_ids, _ = table.query(sort=[('lastWatched', True)])
+    rows = [table.row(row_id) for row_id in row_ids]
+    watched = [row for row in rows if row['lastWatched'] is not None]
+    assert rows == watched + [row for row in rows if row['lastWatched'] is None]
+    assert watched == sorted(watched, key=lambda row: row['lastWatched'], reverse=True)
+    # Ties stay in report order
+    assert list(row_ids) == sorted(range(len(table)), key=lambda row_id: (
+        -(table.data['lastWatched'][row_id]), row_id))
+
+def test_multi_key_sort(table):
+    row_ids, _ = table.query(sort=[('fileSize', True), ('title', False)])
+    assert list(row_ids) == sorted(range(len(table)), key=lambda row_id: (
+        -table.data['fileSize'][row_id], table.data['title'][row_id].casefold()))
+
+def test_cursor_pages_add_up_to_the_full_query(table, client):
+    url = f'/api/reports/{table.id}/rows?status=Stale,Never%20Watched&sort=-fileSize,title'
+    full = client.get(url + '&limit=1000').get_json()
+    assert full['nextCursor'] is None
+
+    rows, cursor = [], None
+    while True:
+        page = client.get(url + '&limit=7' + (f'&cursor={cursor}' if cursor else '')).get_json()
+        assert page['total'] == full['total']
+        rows += page['rows']
+        cursor = page['nextCursor']
+        if cursor is None:
+            break
+    assert rows == full['rows']
+
+def test_cursor_from_another_query_is_rejected(table, client):
+    cursor = client.get(f'/api/reports/{table.id}/rows?sort=title&limit=5').get_json()['nextCursor']
+    response = client.get(f'/api/reports/{table.id}/rows?sort=-title&limit=5&cursor={cursor}')
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'Cursor does not belong to this query'}
+
+@pytest.mark.parametrize('query, error', [
+    ('playCount=many', 'Invalid value for playCount'),
+    ('minLastWatched=yesterday', 'Invalid value for minLastWatched'),
+    ('limit=ten', 'Invalid value for limit'),
+    ('sort=-rating', 'Unknown sort column: rating'),
+    ('rating=5', 'Unknown query parameter: rating'),
+])
+def test_bad_parameters(table, client, query, error):
+    response = client.get(f'/api/reports/{table.id}/rows?{query}')
+    assert response.status_code == 400
+    assert response.get_json() == {'error': error}
+
+def test_unknown_report(client, table):
+    assert client.get('/api/reports/missing/rows').status_code == 404
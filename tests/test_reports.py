@@ -0,0 +1,60 @@
+from datetime import datetime, timedelta
+
+import pytest
+from plexapi.server import PlexServer
+
+import app
+from fake_plex import SyntheticLibrary
+
+CUTOFF = datetime.now() - timedelta(days=30)
+STALE = datetime.now() - timedelta(days=730)
+
+@pytest.fixture
+def library():
+    """Big enough that the movie and episode listings and the history take several pages each"""
+    return SyntheticLibrary(movies=2 * app.LISTING_PAGE_SIZE + 100, shows=30, seasons=4, episodes=6)
+
+@pytest.fixture
+def report(plex_server, library, tmp_path, monkeypatch):
+    """report(kind, workers, bulk=True) -> CSV text"""
+    # Only ten distinct added dates, so many rows tie on their sort key and keep listing order
+    added_at = library.added_at
+    monkeypatch.setattr(library, 'added_at', lambda rating_key: added_at(rating_key % 10))
+
+    def report(kind, workers, bulk=True):
+        fetcher = app.PlexFetcher(workers)
+        try:
+            plex = PlexServer(plex_server.url, 'test', session=fetcher.session)
+            section = plex.library.sectionByID(1 if kind == 'movie' else 2)
+            output = tmp_path / f'{kind}-{workers}-{bulk}.csv'
+            if kind == 'movie':
+                app.generate_movie_report_plexapi(section, str(output), CUTOFF, STALE, {}, full_resync=True,
+                                                  fetcher=fetcher)
+            else:
+                app.generate_tv_report_plexapi(section, str(output), CUTOFF, STALE, {}, full_resync=True,
+                                               fetcher=fetcher, bulk=bulk)
+        finally:
+            fetcher.close()
+        return output.read_text()
+    return report
+
+@pytest.mark.parametrize('kind, bulk', [('movie', True), ('tv', True), ('tv', False)])
+def test_concurrent_fetching_matches_sequential(report, kind, bulk):
+    sequential = report(kind, 1, bulk)
+    assert report(kind, 6, bulk) == sequential
+    assert sequential.count('\n') > 1
+
+def test_bulk_listing_matches_walk_with_fewer_requests(report, plex_server):
+    def children_requests():
+        return sum(count for endpoint, count in plex_server.requests.items() if endpoint.startswith('children:'))
+
+    plex_server.reset_counts()
+    walk = report('tv', 4, bulk=False)
+    walk_requests = children_requests()
+    plex_server.reset_counts()
+    bulk = report('tv', 4, bulk=True)
+
+    assert bulk == walk
+    # Walking asks every show for its seasons and every season for its episodes
+    assert walk_requests >= 30 + 30 * 4
+    assert children_requests() < walk_requests
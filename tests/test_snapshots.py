@@ -0,0 +1,50 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import app
+
+CUTOFF = datetime.now() - timedelta(days=30)
+STALE = datetime.now() - timedelta(days=730)
+
+@pytest.fixture
+def report(plex_server, tmp_path):
+    """report(name, bulk, snapshot_store=None) -> (CSV text, snapshot summary)"""
+    def report(name, bulk, store=None):
+        with app.plex_connections.lease() as conn:
+            section = conn.section(2)
+            snapshot = store.open(section, 'tv') if store else None
+            output = tmp_path / f'{name}.csv'
+            app.generate_tv_report_plexapi(section, str(output), CUTOFF, STALE, {}, fetcher=conn.fetcher,
+                                           bulk=bulk, snapshot=snapshot)
+            if snapshot is None:
+                return output.read_text(), None
+            changes = list(snapshot.changes())
+            snapshot.save()
+            return output.read_text(), dict(snapshot.summary(), changes=changes)
+    return report
+
+@pytest.mark.parametrize('bulk', [True, False])
+def test_unchanged_library_reuses_every_season(report, bulk):
+    store = app.SnapshotStore(app.SNAPSHOT_DB_FILE)
+    full, _ = report('full', bulk)
+    cold, summary = report('cold', bulk, store)
+    assert cold == full and summary['added'] == 8 * 3
+
+    warm, summary = report('warm', bulk, store)
+    assert warm == full
+    # Seasons updated within UPDATED_SLACK of the watermark are always checked again
+    assert summary['reused'] + summary['revalidated'] == 8 * 3
+    assert summary['changes'] == [] and summary['statusChanges'] == 0
+
+@pytest.mark.parametrize('bulk', [True, False])
+def test_replaced_episode_rebuilds_its_season(report, library, bulk):
+    store = app.SnapshotStore(app.SNAPSHOT_DB_FILE)
+    cold, _ = report('cold', bulk, store)
+    library.replace_episode(3, 1, 2)
+
+    warm, summary = report('warm', bulk, store)
+    full, _ = report('full', bulk)
+    assert warm == full != cold
+    assert summary['revalidated'] >= 1 and summary['changed'] >= 1
+    assert summary['reused'] + summary['changed'] == 8 * 3
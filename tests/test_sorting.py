@@ -0,0 +1,38 @@
+import random
+from operator import itemgetter
+
+import app
+
+def pairs(count, seed=1):
+    """(key, row) pairs with lots of repeated keys, rows numbered in insertion order"""
+    rng = random.Random(seed)
+    return [((rng.choice('ABC'), rng.randint(0, 5)), ('row', i)) for i in range(count)]
+
+def test_matches_sorted_across_spills(monkeypatch):
+    monkeypatch.setattr(app, 'SORT_BUFFER_ROWS', 7)
+    items = pairs(500)
+    with app.ExternalSorter() as sorter:
+        for key, row in items:
+            sorter.add(key, row)
+        assert len(sorter._runs) == 500 // 7
+        assert list(sorter) == [row for _, row in sorted(items, key=itemgetter(0))]
+
+def test_equal_keys_keep_insertion_order(monkeypatch):
+    monkeypatch.setattr(app, 'SORT_BUFFER_ROWS', 3)
+    with app.ExternalSorter() as sorter:
+        for i in range(20):
+            sorter.add(i % 2, i)
+        assert list(sorter) == list(range(0, 20, 2)) + list(range(1, 20, 2))
+
+def test_tv_report_same_with_small_buffer(plex_server, monkeypatch, tmp_path):
+    outputs = []
+    for buffer_rows in (50000, 5):
+        monkeypatch.setattr(app, 'SORT_BUFFER_ROWS', buffer_rows)
+        with app.plex_connections.lease() as conn:
+            section = conn.section(2)
+            output = tmp_path / f'tv-{buffer_rows}.csv'
+            app.generate_tv_report_plexapi(section, str(output), app.datetime(2030, 1, 1), app.datetime(2020, 1, 1),
+                                           {}, history=app.HistoryIndex(), fetcher=conn.fetcher)
+        outputs.append(output.read_text())
+    assert outputs[0] == outputs[1]
+    assert outputs[0].count('\n') == 1 + 8 * 3
@@ -0,0 +1,61 @@
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+import app
+
+NOW = datetime(2026, 6, 1)
+
+def tables():
+    """A movie and a TV table with missing years and added dates mixed in"""
+    rng = random.Random(5)
+    movies = app.ReportTable('movie', 'Movies')
+    for i in range(300):
+        added = NOW - timedelta(days=rng.randint(0, 3000)) if i % 9 else None
+        movies.append((f'Movie {i}', rng.choice((None, 1985, 2001, 2020)), added, 0, None,
+                       rng.choice(('Never Watched', 'Stale', 'Recently Watched')), '', 0, rng.randint(1, 10 ** 10)))
+    shows = app.ReportTable('tv', 'TV Shows')
+    for i in range(120):
+        added = NOW - timedelta(days=rng.randint(0, 3000))
+        shows.append((f'Show {i}', 1, 'Unwatched', 10, 0, None, rng.choice(('Never Watched', 'Watched')),
+                      added, rng.randint(1, 10 ** 11), rng.choice((None, 2010))))
+    return [movies.finish(), shows.finish()]
+
+def without_engine(summary):
+    summary.pop('engine')
+    return summary
+
+def test_numpy_and_python_agree(monkeypatch):
+    pytest.importorskip('numpy')
+    data = tables()
+    with_numpy = app.summarize_space(data, now=NOW)
+    assert with_numpy['engine'] == 'numpy'
+    monkeypatch.setattr(app, 'np', None)
+    assert without_engine(app.summarize_space(data, now=NOW)) == without_engine(with_numpy)
+
+@pytest.mark.parametrize('use_numpy', [True, False])
+def test_totals(monkeypatch, use_numpy):
+    if use_numpy:
+        pytest.importorskip('numpy')
+    else:
+        monkeypatch.setattr(app, 'np', None)
+    data = tables()
+    summary = app.summarize_space(data, now=NOW)
+    sizes = [(table.value('status', row_id), table.data['totalSize'][row_id])
+             for table in data for row_id in range(len(table))]
+    assert summary['totals'] == {
+        'items': len(sizes),
+        'bytes': sum(size for _, size in sizes),
+        'reclaimableItems': sum(1 for status, _ in sizes if status in app.RECLAIMABLE_STATUSES),
+        'reclaimableBytes': sum(size for status, size in sizes if status in app.RECLAIMABLE_STATUSES)
+    }
+    for section in ('byLibrary', 'byYear', 'byAddedAge'):
+        assert sum(row['bytes'] for row in summary[section]) == summary['totals']['bytes']
+    assert {row['year'] for row in summary['byYear']} == {None, 1985, 2001, 2020, 2010}
+    assert 'Unknown' in {row['addedAge'] for row in summary['byAddedAge']}
+
+def test_no_tables(monkeypatch):
+    assert app.summarize_space([], now=NOW)['totals']['items'] == 0
+    monkeypatch.setattr(app, 'np', None)
+    assert app.summarize_space([], now=NOW)['byStatus'] == []